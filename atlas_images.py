@@ -0,0 +1,119 @@
+# Atlas des vignettes de cartes
+# ------------------------------------------------------------
+# Les images de images_cartes/ sont grandes (1200 px) : les ouvrir et les
+# redimensionner une par une au démarrage coûte cher. L'atlas regroupe
+# toutes les vignettes d'une taille dans une seule image PNG, avec un
+# index JSON nom de carte -> position. Il est construit une fois (ou
+# reconstruit si une image source a changé), puis chargé d'un bloc.
+#
+#   python atlas_images.py      -> construit les atlas 120 et 60 px
+# ------------------------------------------------------------
+
+import csv
+import json
+import os
+
+from PIL import Image, ImageTk
+
+CARTES_FILE = "dataset/cartes.csv"
+IMAGES_FOLDER = "images_cartes/"
+IMAGE_VIDE = "vide.png"
+TAILLES = (120, 60)
+COLONNES_ATLAS = 16
+# Les vignettes gardent leur transparence (coins arrondis des cartes)
+MODE_ATLAS = "RGBA"
+
+
+def chemins_atlas(taille, dossier=IMAGES_FOLDER):
+    return (os.path.join(dossier, f"atlas_{taille}.png"),
+            os.path.join(dossier, f"atlas_{taille}.json"))
+
+
+def _sources(noms, dossier):
+    """Image source de chaque carte (vide.png si absente) et date de
+    modification de chaque source distincte."""
+    fichiers = {}
+    for nom in noms:
+        fichier = f"{nom}.png"
+        fichiers[nom] = fichier if os.path.exists(os.path.join(dossier, fichier)) else IMAGE_VIDE
+    dates = {f: os.path.getmtime(os.path.join(dossier, f)) for f in set(fichiers.values()) | {IMAGE_VIDE}}
+    return fichiers, dates
+
+
+def construire_atlas(noms, taille, dossier=IMAGES_FOLDER):
+    """Construit l'atlas d'une taille : une vignette par image source."""
+    fichiers, dates = _sources(noms, dossier)
+    distincts = sorted(dates)
+    lignes = (len(distincts) + COLONNES_ATLAS - 1) // COLONNES_ATLAS
+    atlas = Image.new(MODE_ATLAS, (COLONNES_ATLAS * taille, max(lignes, 1) * taille), (0, 0, 0, 0))
+
+    positions = {}
+    for i, fichier in enumerate(distincts):
+        x, y = (i % COLONNES_ATLAS) * taille, (i // COLONNES_ATLAS) * taille
+        with Image.open(os.path.join(dossier, fichier)) as img:
+            # paste sans masque : l'alpha de la vignette est copié tel quel
+            atlas.paste(img.convert(MODE_ATLAS).resize((taille, taille)), (x, y))
+        positions[fichier] = [x, y]
+
+    path_png, path_json = chemins_atlas(taille, dossier)
+    atlas.save(path_png)
+    with open(path_json, "w", encoding="utf-8") as f:
+        json.dump({"taille": taille, "mode": MODE_ATLAS, "sources": dates, "positions": positions,
+                   "cartes": fichiers}, f)
+
+
+def charger_atlas(noms, taille, dossier=IMAGES_FOLDER):
+    """Atlas PIL d'une taille, boîte (x0, y0, x1, y1) de chaque carte et
+    boîte de l'image vide. L'atlas est (re)construit s'il manque, si les
+    sources ont changé ou s'il n'est pas au mode MODE_ATLAS."""
+    path_png, path_json = chemins_atlas(taille, dossier)
+    fichiers, dates = _sources(noms, dossier)
+
+    index = None
+    if os.path.exists(path_png) and os.path.exists(path_json):
+        with open(path_json, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    # un atlas RGB d'avant (sans "mode") est reconstruit
+    if (index is None or index.get("mode") != MODE_ATLAS or index["sources"] != dates
+            or index["cartes"] != fichiers):
+        construire_atlas(noms, taille, dossier)
+        with open(path_json, "r", encoding="utf-8") as f:
+            index = json.load(f)
+
+    atlas = Image.open(path_png)
+    atlas.load()
+    boites = {}
+    for nom, fichier in index["cartes"].items():
+        x, y = index["positions"][fichier]
+        boites[nom] = (x, y, x + taille, y + taille)
+    x, y = index["positions"][IMAGE_VIDE]
+    return atlas, boites, (x, y, x + taille, y + taille)
+
+
+class Vignettes:
+    """Vignettes Tk d'une taille, découpées dans l'atlas à la première
+    utilisation et partagées par tous les widgets."""
+
+    def __init__(self, noms, taille, dossier=IMAGES_FOLDER):
+        self.atlas, self.boites, self.vide = charger_atlas(noms, taille, dossier)
+        self.images = {}  # par boîte : les cartes sans image partagent la vignette vide
+
+    def __getitem__(self, nom):
+        boite = self.boites.get(nom, self.vide)
+        if boite not in self.images:
+            self.images[boite] = ImageTk.PhotoImage(self.atlas.crop(boite))
+        return self.images[boite]
+
+
+def noms_cartes(path=CARTES_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [row[1] for row in reader if row]
+
+
+if __name__ == "__main__":
+    noms = noms_cartes()
+    for taille in TAILLES:
+        construire_atlas(noms, taille)
+        print(f"Atlas {taille} px : {chemins_atlas(taille)[0]}")
@@ -0,0 +1,617 @@
+# Base de combats compacte
+# ------------------------------------------------------------
+# Le fichier combats_joueurs.csv est converti une seule fois en mémoire :
+# chaque carte reçoit son id de cartes.csv (1 à 121) et chaque deck de
+# 8 cartes devient un masque de 128 bits (deux colonnes uint64).
+# Le chevauchement entre un deck et tous les combats se calcule alors
+# par un popcount vectorisé au lieu d'un parcours du CSV.
+# Sur disque, la base est gardée au format binaire de stockage_binaire.py.
+# ------------------------------------------------------------
+
+import csv
+import os
+from collections import OrderedDict
+from array import array
+
+import numpy as np
+
+import instrumentation
+
+CARTES_FILE = "dataset/cartes.csv"
+DONNEES_COMBATS = "dataset/combats_joueurs.csv"
+
+# L'index inversé n'est utilisé que si les listes de lignes à fusionner
+# totalisent moins de RATIO_INDEX fois le nombre de lignes parcourues
+# par le popcount (mesuré : la fusion coûte ~4x plus par élément).
+RATIO_INDEX = 0.25
+# Pour victoires_par_precision, le parcours des masques est fusionné
+# (histogrammes_duel) : mesuré sur 1M combats, 13 ms contre ~195 ms par
+# unité de volume pour la fusion des 4 listes, d'où un seuil bien plus bas.
+RATIO_INDEX_DUEL = 0.06
+# Lignes traitées à la fois par histogrammes_duel (tampons dans le cache)
+TAILLE_BLOC_DUEL = 1 << 15
+# Au-delà de cette fraction de la base, une tranche est comptée comme toute
+# la base (blocs contigus) moins les lignes hors tranche, plutôt que par
+# lignes extraites (mesuré sur 1M combats : l'extraction coûte autant qu'un
+# parcours complet vers 50 % des lignes)
+FRACTION_TRANCHE_DENSE = 0.5
+# Tranches de trophées gardées par base (lignes triées, les plus récentes)
+TRANCHES_EN_CACHE = 16
+
+
+# ================================================================
+# Cartes : nom -> id
+# ================================================================
+def charger_ids_cartes(path=CARTES_FILE):
+    """Retourne le dictionnaire nom de carte -> id (1 à 121)."""
+    ids = {}
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            if row:
+                ids[row[1]] = int(row[0])
+    return ids
+
+
+# ================================================================
+# Masques 128 bits
+# ================================================================
+# La carte d'id k occupe le bit (k - 1) : ids 1 à 64 dans la colonne
+# basse, ids 65 à 128 dans la colonne haute. L'id 0 (carte inconnue)
+# n'occupe aucun bit.
+if hasattr(np, "bitwise_count"):
+    def popcount(x):
+        return np.bitwise_count(x)
+
+    def _popcount_dans(x, out):
+        return np.bitwise_count(x, out=out)
+else:
+    _POPCOUNT_OCTETS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(x):
+        octets = x.view(np.uint8).reshape(x.shape + (8,))
+        return _POPCOUNT_OCTETS[octets].sum(axis=-1, dtype=np.uint8)
+
+    def _popcount_dans(x, out):
+        return np.sum(_POPCOUNT_OCTETS[x.view(np.uint8).reshape(x.shape + (8,))], axis=-1, dtype=np.uint8, out=out)
+
+
+def masque_deck(ids):
+    """Masque (bas, haut) d'une liste d'ids de cartes."""
+    bas = 0
+    haut = 0
+    for cid in ids:
+        if 1 <= cid <= 64:
+            bas |= 1 << (cid - 1)
+        elif 65 <= cid <= 128:
+            haut |= 1 << (cid - 65)
+    return np.uint64(bas), np.uint64(haut)
+
+
+# bit de chaque id (uint8) dans la colonne basse / haute, 0 hors colonne
+_BITS_BAS = np.array([1 << (c - 1) if 1 <= c <= 64 else 0 for c in range(256)], dtype=np.uint64)
+_BITS_HAUT = np.array([1 << (c - 65) if 65 <= c <= 128 else 0 for c in range(256)], dtype=np.uint64)
+
+
+def masques_depuis_ids(ids, taille_bloc=1 << 20):
+    """Masques (bas, haut) de chaque ligne d'une matrice (N, 8) d'ids."""
+    bas = np.zeros(len(ids), dtype=np.uint64)
+    haut = np.zeros(len(ids), dtype=np.uint64)
+    for debut in range(0, len(ids), taille_bloc):
+        bloc = np.asarray(ids[debut:debut + taille_bloc])
+        for col in range(bloc.shape[1]):
+            bas[debut:debut + len(bloc)] |= _BITS_BAS[bloc[:, col]]
+            haut[debut:debut + len(bloc)] |= _BITS_HAUT[bloc[:, col]]
+    return bas, haut
+
+
+# ================================================================
+# Index inversé : id de carte -> lignes de combat
+# ================================================================
+def valeurs_et_comptes(valeurs):
+    """Valeurs distinctes triées et leur nombre d'occurrences (tri + diff,
+    plus rapide que np.unique sur de grands tableaux d'entiers)."""
+    valeurs = np.sort(valeurs)
+    if len(valeurs) == 0:
+        return valeurs, np.empty(0, dtype=np.int64)
+    debuts = np.flatnonzero(np.concatenate(([True], valeurs[1:] != valeurs[:-1])))
+    return valeurs[debuts], np.diff(np.append(debuts, len(valeurs)))
+
+
+def construire_index(ids, nb_ids, debut=0):
+    """Listes triées de lignes par id de carte, au format CSR :
+    les lignes de la carte c sont lignes[offsets[c]:offsets[c + 1]].
+    debut : numéro de la première ligne de ids dans la base."""
+    nb_lignes, largeur = ids.shape
+    cles = ids.astype(np.int64).ravel() * nb_lignes
+    cles += np.repeat(np.arange(nb_lignes, dtype=np.int64), largeur)
+    cles, _ = valeurs_et_comptes(cles)  # trie par carte puis par ligne, sans doublons
+
+    offsets = np.zeros(nb_ids + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(cles // max(nb_lignes, 1), minlength=nb_ids))
+    return offsets, (cles % max(nb_lignes, 1) + debut).astype(np.uint32)
+
+
+def fusionner_segments(segments, nb_ids):
+    """Fusionne des segments CSR consécutifs en un seul : la liste d'une
+    carte est la concaténation de ses listes, déjà triées segment par segment."""
+    offsets = np.zeros(nb_ids + 1, dtype=np.int64)
+    for off, _ in segments:
+        offsets[1:] += np.diff(off)
+    offsets = np.cumsum(offsets)
+    lignes = np.concatenate([lig[off[c]:off[c + 1]] for c in range(nb_ids) for off, lig in segments]
+                            or [np.empty(0, dtype=np.uint32)])
+    return offsets, lignes.astype(np.uint32)
+
+
+class IndexInverse:
+    """Listes de lignes par carte, séparément côté gagnant et côté perdant.
+
+    Chaque côté est une suite de segments CSR (offsets, lignes) couvrant
+    des plages de lignes consécutives : un ajout de combats crée un nouveau
+    segment au lieu de reconstruire l'index."""
+
+    def __init__(self, segments_g, segments_p):
+        self.segments = {"g": segments_g, "p": segments_p}
+
+    @staticmethod
+    def depuis_ids(ids_g, ids_p, nb_ids):
+        return IndexInverse([construire_index(ids_g, nb_ids)], [construire_index(ids_p, nb_ids)])
+
+    def lignes(self, cote, c):
+        """Lignes triées dont le deck du côté donné contient la carte c."""
+        listes = [lig[off[c]:off[c + 1]] for off, lig in self.segments[cote]]
+        if not listes:  # base sans aucune ligne : pas de segment
+            return np.empty(0, dtype=np.uint32)
+        return np.concatenate(listes) if len(listes) > 1 else listes[0]
+
+    def volume(self, cote, ids):
+        """Nombre total de lignes dans les listes des cartes ids."""
+        return int(sum(off[c + 1] - off[c] for off, _ in self.segments[cote] for c in ids))
+
+    def chevauchements(self, cote, ids):
+        """Lignes triées dont le deck du côté donné contient au moins une
+        carte de ids, avec le nombre de cartes communes (fusion des listes)."""
+        listes = [lig[off[c]:off[c + 1]] for off, lig in self.segments[cote] for c in ids]
+        if not listes:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int64)
+        return valeurs_et_comptes(np.concatenate(listes))
+
+    def lignes_compatibles(self, cote, ids, seuil):
+        """Lignes triées dont le deck du côté donné contient au moins seuil
+        cartes de ids."""
+        if seuil <= 0:
+            raise ValueError("seuil doit être >= 1 pour utiliser l'index")
+        candidates, comptes = self.chevauchements(cote, ids)
+        return candidates[comptes >= seuil]
+
+
+# ================================================================
+# Agrégats : compteurs par carte et par paire de cartes
+# ================================================================
+class AgregatsCombats:
+    """Compteurs tenus à jour à chaque ajout de combats (indices = ids) :
+    - victoires[c], defaites[c] : combats gagnés / perdus par un deck avec c
+    - duels[i, j] : combats où i est chez le gagnant et j chez le perdant
+    - paires_g[i, j], paires_p[i, j] : i et j dans le même deck gagnant /
+      perdant (la diagonale reprend victoires / defaites)
+    """
+
+    NOMS = ("victoires", "defaites", "duels", "paires_g", "paires_p")
+
+    def __init__(self, nb_ids, tableaux=None):
+        self.nb_ids = nb_ids
+        if tableaux is None:
+            tableaux = {
+                "victoires": np.zeros(nb_ids, dtype=np.int64),
+                "defaites": np.zeros(nb_ids, dtype=np.int64),
+                "duels": np.zeros((nb_ids, nb_ids), dtype=np.int64),
+                "paires_g": np.zeros((nb_ids, nb_ids), dtype=np.int64),
+                "paires_p": np.zeros((nb_ids, nb_ids), dtype=np.int64),
+            }
+        for nom in self.NOMS:
+            setattr(self, nom, tableaux[nom])
+
+    def _paires(self, a, b):
+        # nombre de lignes pour chaque couple (a[ligne, k], b[ligne, l])
+        cles = a.astype(np.int64)[:, :, None] * self.nb_ids + b[:, None, :]
+        return np.bincount(cles.ravel(), minlength=self.nb_ids ** 2).reshape(self.nb_ids, self.nb_ids)
+
+    def ajouter(self, ids_g, ids_p, taille_bloc=200_000):
+        """Ajoute la contribution des combats (ids_g[i], ids_p[i])."""
+        for debut in range(0, len(ids_g), taille_bloc):
+            cg = np.asarray(ids_g[debut:debut + taille_bloc])
+            cp = np.asarray(ids_p[debut:debut + taille_bloc])
+            self.victoires += np.bincount(cg.ravel(), minlength=self.nb_ids)
+            self.defaites += np.bincount(cp.ravel(), minlength=self.nb_ids)
+            self.duels += self._paires(cg, cp)
+            self.paires_g += self._paires(cg, cg)
+            self.paires_p += self._paires(cp, cp)
+
+    def sauvegarder(self, path):
+        np.savez(path, **{nom: getattr(self, nom) for nom in self.NOMS})
+
+    @staticmethod
+    def charger(path):
+        with np.load(path) as data:
+            tableaux = {nom: data[nom] for nom in AgregatsCombats.NOMS}
+        return AgregatsCombats(len(tableaux["victoires"]), tableaux)
+
+
+# Les taux tirés des agrégats (carte, paire, duel) sont lissés vers un a
+# priori avec ce poids (en combats), puis comparés en log-cotes.
+PRIOR_DUEL = 20
+
+
+def logit(p):
+    """Log-cote d'une probabilité (bornée pour rester finie en 0 et 1)."""
+    p = np.clip(p, 1e-6, 1 - 1e-6)
+    return np.log(p / (1 - p))
+
+
+# ================================================================
+# Base de combats
+# ================================================================
+class BaseCombats:
+    """Combats en mémoire : ids des cartes, trophées et masques par camp."""
+
+    def __init__(self, ids_g, ids_p, trophees_g, trophees_p, ids_cartes, signature=None,
+                 dossier=None, meta=None):
+        self.ids_g = ids_g
+        self.ids_p = ids_p
+        self.trophees_g = trophees_g
+        self.trophees_p = trophees_p
+        self.ids_cartes = ids_cartes
+        self.signature = signature
+        self.dossier = dossier
+        self.meta = meta
+        self._index = None
+        self._agregats = None
+        self._index_trophees = None
+        self._masques = None
+        self._tranches = OrderedDict()  # (trophees, ecart_max) -> [lignes, hors tranche]
+
+        # id -> nom (l'id 0 reste vide : carte inconnue)
+        self.noms_cartes = [""] * (max(ids_cartes.values(), default=0) + 1)
+        for nom, cid in ids_cartes.items():
+            self.noms_cartes[cid] = nom
+
+    def __len__(self):
+        return len(self.ids_g)
+
+    def ids_deck(self, noms):
+        """Ids des cartes d'un deck (les noms inconnus sont ignorés)."""
+        return [self.ids_cartes[n] for n in set(noms) if n in self.ids_cartes]
+
+    @property
+    def masques(self):
+        """Masques (bas, haut) des decks gagnants puis perdants, déduits des
+        ids à la première utilisation.
+
+        Base d'un dossier binaire : fichiers memmap partagés par tous les
+        processus (stockage_binaire.ouvrir_masques) ; mesuré sur 1M combats,
+        la première requête ajoutait 38 Mo de mémoire privée à chaque
+        processus, 0 Mo une fois mappés (pages du cache disque). Base lue
+        du CSV, génération supprimée ou dossier en lecture seule : tableaux
+        en mémoire (32 octets par ligne)."""
+        if self._masques is None:
+            if self.meta is not None:
+                import stockage_binaire
+                try:
+                    self._masques = stockage_binaire.ouvrir_masques(self.dossier, self.meta, self.ids_g, self.ids_p)
+                except OSError:
+                    pass
+            if self._masques is None:
+                self._masques = masques_depuis_ids(self.ids_g) + masques_depuis_ids(self.ids_p)
+        return self._masques
+
+    @property
+    def masque_g_bas(self):
+        return self.masques[0]
+
+    @property
+    def masque_g_haut(self):
+        return self.masques[1]
+
+    @property
+    def masque_p_bas(self):
+        return self.masques[2]
+
+    @property
+    def masque_p_haut(self):
+        return self.masques[3]
+
+    def chevauchement_gagnant(self, masque, lignes=None):
+        """Nombre de cartes communes entre un deck et chaque deck gagnant
+        (ou seulement ceux des lignes données)."""
+        bas, haut = masque
+        if lignes is not None:
+            return popcount(self.masque_g_bas[lignes] & bas) + popcount(self.masque_g_haut[lignes] & haut)
+        return popcount(self.masque_g_bas & bas) + popcount(self.masque_g_haut & haut)
+
+    def chevauchement_perdant(self, masque, lignes=None):
+        """Nombre de cartes communes entre un deck et chaque deck perdant
+        (ou seulement ceux des lignes données)."""
+        bas, haut = masque
+        if lignes is not None:
+            return popcount(self.masque_p_bas[lignes] & bas) + popcount(self.masque_p_haut[lignes] & haut)
+        return popcount(self.masque_p_bas & bas) + popcount(self.masque_p_haut & haut)
+
+    def histogrammes_duel(self, masque_a, masque_b, lignes=None, progression=None):
+        """(hist_a, hist_b) : hist_a[k] = combats (des lignes données) où
+        min(cartes de a chez le gagnant, cartes de b chez le perdant) vaut k,
+        hist_b de même avec a et b échangés.
+
+        Un seul passage par blocs : les 4 chevauchements d'un bloc sont
+        calculés dans des tampons uint8 réutilisés, et les deux minimums
+        codés min_a * 9 + min_b pour un seul bincount par bloc. Des lignes
+        couvrant la plus grande partie de la base sont comptées comme toute
+        la base moins les lignes restantes.
+        progression(lignes parcourues, fraction) est appelée après chaque bloc."""
+        if lignes is not None and len(lignes) > FRACTION_TRANCHE_DENSE * len(self):
+            tout_a, tout_b = self.histogrammes_duel(masque_a, masque_b, progression=progression)
+            hors_a, hors_b = self.histogrammes_duel(masque_a, masque_b, self.lignes_hors(lignes))
+            return tout_a - hors_a, tout_b - hors_b
+
+        colonnes = self.masques  # g_bas, g_haut, p_bas, p_haut
+        n = len(self) if lignes is None else len(lignes)
+        # moitiés (bas / haut) où l'un des decks a au moins une carte
+        moities = [m for m in (0, 1) if masque_a[m] or masque_b[m]]
+        extraits = np.empty((4, TAILLE_BLOC_DUEL), dtype=np.uint64)
+        positions = np.empty(TAILLE_BLOC_DUEL, dtype=np.intp)
+        et = np.empty(TAILLE_BLOC_DUEL, dtype=np.uint64)
+        comptes = np.empty((5, TAILLE_BLOC_DUEL), dtype=np.uint8)
+        codes = np.zeros(81, dtype=np.int64)
+        for debut in range(0, n, TAILLE_BLOC_DUEL):
+            fin = min(debut + TAILLE_BLOC_DUEL, n)
+            k = fin - debut
+            if lignes is None:
+                bloc = [col[debut:fin] for col in colonnes]
+            else:
+                # indices convertis une fois pour les 4 colonnes
+                pos = positions[:k]
+                pos[:] = lignes[debut:fin]
+                bloc = [np.take(col, pos, out=extraits[i, :k]) for i, col in enumerate(colonnes)]
+            g_a, g_b, p_a, p_b, tampon = (c[:k] for c in comptes)
+            for out, cote, masque in ((g_a, 0, masque_a), (g_b, 0, masque_b), (p_a, 2, masque_a), (p_b, 2, masque_b)):
+                if not moities:
+                    out[:] = 0
+                for i, m in enumerate(moities):
+                    np.bitwise_and(bloc[cote + m], masque[m], out=et[:k])
+                    if i:
+                        _popcount_dans(et[:k], tampon)
+                        np.add(out, tampon, out=out)
+                    else:
+                        _popcount_dans(et[:k], out)
+            np.minimum(g_a, p_b, out=g_a)
+            np.minimum(g_b, p_a, out=g_b)
+            np.multiply(g_a, 9, out=g_a)
+            np.add(g_a, g_b, out=g_a)
+            codes += np.bincount(g_a, minlength=81)
+            if progression is not None:
+                progression(fin, fin / n)
+        codes = codes.reshape(9, 9)
+        return codes.sum(axis=1), codes.sum(axis=0)
+
+    @property
+    def index(self):
+        """Index inversé : segments du dossier binaire listés dans meta, ou
+        construit en mémoire pour une base lue directement du CSV."""
+        if self._index is None:
+            if self.meta is not None:
+                import stockage_binaire
+                self._index = stockage_binaire.ouvrir_index(self.dossier, self.meta)
+            else:
+                self._index = IndexInverse.depuis_ids(self.ids_g, self.ids_p, len(self.noms_cartes))
+        return self._index
+
+    @property
+    def agregats(self):
+        """Compteurs par carte / paire (AgregatsCombats) de cette version ;
+        tous nuls pour un dossier encore sans ligne (pas de fichier)."""
+        if self._agregats is None:
+            if self.meta is not None and self.meta["agregats"] is not None:
+                self._agregats = AgregatsCombats.charger(os.path.join(self.dossier, self.meta["agregats"]))
+            else:
+                self._agregats = AgregatsCombats(len(self.noms_cartes))
+                self._agregats.ajouter(self.ids_g, self.ids_p)
+        return self._agregats
+
+    def index_avantageux(self, requetes, seuil, nb_lignes=None, ratio=RATIO_INDEX):
+        """Vrai si fusionner les listes de l'index coûte moins qu'un parcours
+        des nb_lignes lignes à examiner (toute la base par défaut).
+        requetes : liste de couples (côté, ids de cartes)."""
+        if nb_lignes is None:
+            nb_lignes = len(self)
+        if seuil <= 0 or nb_lignes == 0:
+            return False
+        volume = sum(self.index.volume(cote, ids) for cote, ids in requetes)
+        return volume < ratio * nb_lignes * len(requetes)
+
+    @property
+    def index_trophees(self):
+        """(trophées triés, lignes) : lignes triées par le plus haut des deux
+        trophées de départ du combat."""
+        if self._index_trophees is None:
+            cles = np.maximum(np.asarray(self.trophees_g), np.asarray(self.trophees_p))
+            ordre = np.argsort(cles, kind="stable").astype(np.uint32)
+            self._index_trophees = cles[ordre], ordre
+        return self._index_trophees
+
+    def lignes_tranche(self, trophees=None, ecart_max=None):
+        """Lignes triées des combats dont les deux joueurs ont entre
+        trophees[0] et trophees[1] trophées au départ, avec au plus ecart_max
+        trophées d'écart. None si aucune restriction n'est demandée.
+
+        La borne haute porte sur le maximum des deux joueurs : une plage
+        contiguë de l'index des trophées, seule examinée ensuite. Les
+        TRANCHES_EN_CACHE dernières tranches demandées sont gardées (tableaux
+        en lecture seule)."""
+        if trophees is None and ecart_max is None:
+            return None
+        cle = (None if trophees is None else tuple(trophees), ecart_max)
+        entree = self._tranches.get(cle)
+        if entree is None:
+            lignes = self._calculer_tranche(trophees, ecart_max)
+            lignes.flags.writeable = False
+            entree = self._tranches[cle] = [lignes, None]
+            while len(self._tranches) > TRANCHES_EN_CACHE:
+                self._tranches.popitem(last=False)
+        self._tranches.move_to_end(cle)
+        return entree[0]
+
+    def lignes_hors(self, lignes):
+        """Lignes triées de la base absentes des lignes triées données,
+        gardées avec la tranche si lignes vient de lignes_tranche."""
+        entree = next((e for e in self._tranches.values() if e[0] is lignes), None)
+        if entree is not None and entree[1] is not None:
+            return entree[1]
+        garder = np.ones(len(self), dtype=bool)
+        garder[lignes] = False
+        hors = np.flatnonzero(garder).astype(np.uint32)
+        if entree is not None:
+            hors.flags.writeable = False
+            entree[1] = hors
+        return hors
+
+    def _calculer_tranche(self, trophees, ecart_max):
+        if trophees is not None:
+            cles, ordre = self.index_trophees
+            debut = np.searchsorted(cles, trophees[0], side="left")
+            fin = np.searchsorted(cles, trophees[1], side="right")
+            lignes = np.sort(ordre[debut:fin])
+        else:
+            lignes = np.arange(len(self), dtype=np.uint32)
+
+        tg = np.asarray(self.trophees_g[lignes])
+        tp = np.asarray(self.trophees_p[lignes])
+        garder = np.ones(len(lignes), dtype=bool)
+        if trophees is not None:
+            garder &= np.minimum(tg, tp) >= trophees[0]
+        if ecart_max is not None:
+            garder &= np.abs(tg.astype(np.int64) - tp) <= ecart_max
+        return lignes[garder]
+
+    def histogramme_cartes(self, lignes_g, lignes_p):
+        """Occurrences de chaque id de carte dans les decks gagnants des lignes
+        lignes_g et dans les decks perdants des lignes lignes_p.
+
+        Équivaut à la somme des colonnes de la matrice (N, 121) des decks,
+        sans la construire : bincount sur les ids des lignes retenues.
+        """
+        taille = len(self.noms_cartes)
+        hist = np.bincount(self.ids_g[lignes_g].ravel(), minlength=taille)
+        hist += np.bincount(self.ids_p[lignes_p].ravel(), minlength=taille)
+        hist[0] = 0
+        return hist
+
+    def meilleures_cartes(self, hist, n=8):
+        """Les n cartes les plus fréquentes (égalités départagées par id)."""
+        ordre = np.lexsort((np.arange(len(hist)), -hist))
+        return [self.noms_cartes[cid] for cid in ordre[:n] if hist[cid] > 0]
+
+
+def signature_fichier(path):
+    """Taille et date de modification : change dès que le fichier est modifié."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def lire_csv_combats(path=DONNEES_COMBATS, ids_cartes=None):
+    """Convertit combats_joueurs.csv en BaseCombats en mémoire (sans passer
+    par le format binaire)."""
+    if ids_cartes is None:
+        ids_cartes = charger_ids_cartes()
+    get = ids_cartes.get
+
+    signature = signature_fichier(path)
+    ids_g = bytearray()
+    ids_p = bytearray()
+    trophees_g = array("i")
+    trophees_p = array("i")
+
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            if len(row) < 20:
+                continue
+            ids_g.extend([get(n, 0) for n in row[2:10]])
+            ids_p.extend([get(n, 0) for n in row[12:20]])
+            trophees_g.append(int(row[1]))
+            trophees_p.append(int(row[11]))
+
+    return BaseCombats(
+        np.frombuffer(ids_g, dtype=np.uint8).reshape(-1, 8),
+        np.frombuffer(ids_p, dtype=np.uint8).reshape(-1, 8),
+        np.frombuffer(trophees_g, dtype=np.int32),
+        np.frombuffer(trophees_p, dtype=np.int32),
+        ids_cartes,
+        signature,
+    )
+
+
+def ouvrir_base(dossier, meta=None):
+    """BaseCombats sur les colonnes memmap d'un dossier binaire."""
+    import stockage_binaire
+
+    if meta is None:
+        meta = stockage_binaire.lire_meta(dossier)
+    col = stockage_binaire.ouvrir_colonnes(dossier, meta)
+    ids_cartes = {nom: cid for cid, nom in meta["cartes"]}
+    base = BaseCombats(
+        col["cg"], col["cp"], col["tropheesg"], col["tropheesp"], ids_cartes,
+        signature=(meta["version"], meta["nb_lignes"]),
+        dossier=dossier,
+        meta=meta,
+    )
+    # index (memmap) et agrégats ouverts tout de suite, avec les colonnes :
+    # leurs fichiers peuvent être supprimés par une synchronisation
+    # ultérieure, seuls les fichiers déjà ouverts restent lisibles
+    base.index, base.agregats
+    return base
+
+
+# Une base par fichier, rouverte seulement si les données ont changé
+_bases = {}
+_ids_cartes = {}
+
+
+def synchroniser_base(path=DONNEES_COMBATS, progression=None):
+    """Complète le dossier binaire avec les nouvelles lignes du CSV et
+    retourne sa signature (version, nb_lignes), sans ouvrir les colonnes.
+    progression(lignes, fraction) suit l'ajout des lignes."""
+    import stockage_binaire
+
+    dossier = stockage_binaire.chemin_binaire(path)
+    if os.path.exists(path):
+        if CARTES_FILE not in _ids_cartes:
+            _ids_cartes[CARTES_FILE] = charger_ids_cartes()
+        # lecture des nouvelles lignes du CSV (le « parse » des analyses)
+        with instrumentation.chrono("synchronisation_base"):
+            meta = stockage_binaire.synchroniser(path, dossier, _ids_cartes[CARTES_FILE], progression)
+    else:
+        meta = stockage_binaire.lire_meta(dossier)
+        if meta is None:
+            raise FileNotFoundError(path)
+    return meta["version"], meta["nb_lignes"]
+
+
+def charger_base(path=DONNEES_COMBATS, progression=None):
+    """Base du fichier de combats, lue en memmap depuis son format binaire.
+
+    Le dossier binaire est créé ou complété à partir du CSV si celui-ci a
+    grossi ; sans CSV, le dossier binaire existant est utilisé tel quel.
+    Les colonnes sont ouvertes en lecture seule : un seul mapping par
+    processus, dont les pages sont partagées entre processus par l'OS.
+    progression : voir synchroniser_base.
+    """
+    import stockage_binaire
+
+    signature = synchroniser_base(path, progression)
+    base = _bases.get(path)
+    if base is None or base.signature != signature:
+        base = ouvrir_base(stockage_binaire.chemin_binaire(path))
+        _bases[path] = base
+    return base
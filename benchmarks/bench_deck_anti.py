@@ -0,0 +1,66 @@
+# Comparaison generer_deck_anti (base vectorisée) / generer_deck_anti_csv
+# ------------------------------------------------------------
+# python benchmarks/bench_deck_anti.py [tailles...]   (par défaut 100k 1M 10M)
+# À lancer depuis la racine du projet.
+# ------------------------------------------------------------
+
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+import ia_generative
+from base_combats import lire_csv_combats, masque_deck
+from generateur_combats import generer_csv
+
+TAILLES = [100_000, 1_000_000, 10_000_000]
+PRECISIONS = [2, 4, 6]
+
+
+def memes_frequences(base, deck, precision, cartes_a, cartes_b):
+    """Vrai si les deux listes ont les mêmes fréquences (seules les égalités diffèrent)."""
+    masque = masque_deck(base.ids_deck(deck))
+    hist = base.histogramme_cartes(np.flatnonzero(base.chevauchement_perdant(masque) >= precision),
+                                   np.flatnonzero(base.chevauchement_gagnant(masque) >= precision))
+    freq = lambda cartes: sorted(hist[base.ids_cartes[c]] for c in cartes)
+    return freq(cartes_a) == freq(cartes_b)
+
+
+def mesurer(nb_combats, dossier):
+    path = os.path.join(dossier, f"combats_{nb_combats}.csv")
+    if not os.path.exists(path):
+        generer_csv(path, nb_combats)
+    ia_generative.DONNEES_COMBATS = path
+
+    t0 = perf_counter()
+    base = lire_csv_combats(path)
+    chargement = perf_counter() - t0
+
+    noms = [name for _, name in ia_generative.load_cards()]
+    deck = random.Random(nb_combats).sample(noms[:40], 8)
+
+    print(f"\n{nb_combats} combats (chargement base : {chargement:.2f}s)")
+    for precision in PRECISIONS:
+        t0 = perf_counter()
+        vect = ia_generative.generer_deck_anti(deck, precision, base=base)
+        t_vect = perf_counter() - t0
+
+        t0 = perf_counter()
+        ref = ia_generative.generer_deck_anti_csv(deck, precision)
+        t_csv = perf_counter() - t0
+
+        # même top 8 au départage des égalités près
+        identique = vect[1] == ref[1] and memes_frequences(base, deck, precision, vect[0], ref[0])
+        print(f"  précision {precision} : vectorisé {t_vect * 1000:8.1f} ms | "
+              f"CSV {t_csv * 1000:9.1f} ms | x{t_csv / t_vect:6.0f} | identique={identique}")
+
+
+if __name__ == "__main__":
+    tailles = [int(t) for t in sys.argv[1:]] or TAILLES
+    with tempfile.TemporaryDirectory() as dossier:
+        for nb in tailles:
+            mesurer(nb, dossier)
@@ -0,0 +1,77 @@
+# Démarrage de IA_Generative_App : images et widgets
+# ------------------------------------------------------------
+# python benchmarks/bench_interface.py
+# À lancer depuis la racine du projet. La partie Tk demande un affichage
+# (DISPLAY) ; sans affichage, seule la préparation des images est mesurée.
+# ------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image
+
+import atlas_images
+import ia_generative
+
+
+def images_une_par_une(noms, dossier, tailles):
+    """Ancienne préparation : ouverture et redimensionnement de chaque image."""
+    for taille in tailles:
+        for nom in noms:
+            path = os.path.join(dossier, f"{nom}.png")
+            if not os.path.exists(path):
+                path = os.path.join(dossier, atlas_images.IMAGE_VIDE)
+            Image.open(path).resize((taille, taille))
+
+
+def mesurer(fonction, *args):
+    tracemalloc.start()
+    t0 = perf_counter()
+    fonction(*args)
+    duree = perf_counter() - t0
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duree, pic
+
+
+def compter_widgets(widget):
+    return 1 + sum(compter_widgets(w) for w in widget.winfo_children())
+
+
+if __name__ == "__main__":
+    noms = atlas_images.noms_cartes()
+
+    with tempfile.TemporaryDirectory() as dossier:
+        for f in os.listdir(atlas_images.IMAGES_FOLDER):
+            if not f.startswith("atlas_"):
+                shutil.copy(os.path.join(atlas_images.IMAGES_FOLDER, f), dossier)
+
+        duree, pic = mesurer(images_une_par_une, noms, dossier, [120])
+        print(f"Images une par une (grille 120 px) : {duree * 1000:8.1f} ms, pic {pic / 1e6:6.1f} Mo")
+        duree, pic = mesurer(lambda: [atlas_images.construire_atlas(noms, t, dossier) for t in atlas_images.TAILLES])
+        print(f"Construction des atlas (une fois)  : {duree * 1000:8.1f} ms, pic {pic / 1e6:6.1f} Mo")
+        duree, pic = mesurer(lambda: [atlas_images.charger_atlas(noms, t, dossier) for t in atlas_images.TAILLES])
+        print(f"Chargement des atlas               : {duree * 1000:8.1f} ms, pic {pic / 1e6:6.1f} Mo")
+
+    if not os.environ.get("DISPLAY") and sys.platform.startswith("linux"):
+        print("Pas d'affichage : démarrage Tk non mesuré.")
+        sys.exit()
+
+    import tkinter as tk
+
+    root = tk.Tk()
+    tracemalloc.start()
+    t0 = perf_counter()
+    app = ia_generative.IA_Generative_App(root)
+    root.update()
+    duree = perf_counter() - t0
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Démarrage IA_Generative_App        : {duree * 1000:8.1f} ms, pic {pic / 1e6:6.1f} Mo, "
+          f"{compter_widgets(root)} widgets ({len(app.cellules)} cartes affichées sur {len(app.cards)})")
+    root.destroy()
@@ -0,0 +1,58 @@
+# Passage à l'échelle du parcours parallèle du CSV (scan_parallele.py)
+# ------------------------------------------------------------
+# python benchmarks/bench_scan_parallele.py [nb_combats]   (par défaut 2M)
+# Mesure analyse_combat_csv et generer_deck_anti_csv avec 1, 2, 4...
+# processus jusqu'au nombre de cœurs, et vérifie que les résultats ne
+# dépendent pas du nombre de processus.
+# À lancer depuis la racine du projet.
+# ------------------------------------------------------------
+
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ia_generative
+import ia_predictive
+from generateur_combats import generer_csv
+
+NB_COMBATS = 2_000_000
+PRECISION = 4
+
+
+def nombres_processus():
+    nb, nb_coeurs = 1, os.cpu_count() or 1
+    while nb < nb_coeurs:
+        yield nb
+        nb *= 2
+    yield nb_coeurs
+
+
+if __name__ == "__main__":
+    nb_combats = int(sys.argv[1]) if len(sys.argv) > 1 else NB_COMBATS
+    with tempfile.TemporaryDirectory() as dossier:
+        path = os.path.join(dossier, f"combats_{nb_combats}.csv")
+        generer_csv(path, nb_combats)
+        ia_predictive.DONNEES_COMBATS = ia_generative.DONNEES_COMBATS = path
+
+        noms = [name for _, name in ia_generative.load_cards()]
+        rng = random.Random(0)
+        d1, d2 = rng.sample(noms[:40], 8), rng.sample(noms[:40], 8)
+        print(f"{nb_combats} combats ({os.path.getsize(path) / 1e6:.0f} Mo), {os.cpu_count()} cœurs")
+
+        references = None
+        for nb in nombres_processus():
+            t0 = perf_counter()
+            analyse = ia_predictive.analyse_combat_csv(d1, d2, PRECISION, nb_processus=nb)
+            t_analyse = perf_counter() - t0
+            t0 = perf_counter()
+            deck_anti = ia_generative.generer_deck_anti_csv(d1, PRECISION, nb_processus=nb)
+            t_deck = perf_counter() - t0
+
+            if references is None:
+                references = (analyse, deck_anti, t_analyse, t_deck)
+            identique = (analyse, deck_anti) == references[:2]
+            print(f"  {nb:>3} processus : analyse_combat_csv {t_analyse:6.2f}s (x{references[2] / t_analyse:4.1f}) | "
+                  f"generer_deck_anti_csv {t_deck:6.2f}s (x{references[3] / t_deck:4.1f}) | identique={identique}")
@@ -0,0 +1,220 @@
+# Suite de benchmarks : chargement, requêtes, génération de contre-decks
+# ------------------------------------------------------------
+# Pour chaque taille, un CSV synthétique (generateur_combats.py) est
+# mesuré dans un processus neuf :
+#   - chargement à froid : conversion CSV -> binaire, ouverture memmap,
+#     index inversé, agrégats, et lecture directe du CSV en mémoire
+#   - requêtes à chaud (cache vidé) : analyse_combat à chaque précision 1-8,
+#     et analyse_tournoi sur tous les decks des requêtes
+#   - contre-decks : generer_deck_anti et rechercher_deck_anti
+#   - pic mémoire (ru_maxrss du processus), avant et après la lecture
+#     complète du CSV en mémoire
+# Le résultat est écrit en JSON pour comparer deux versions du moteur :
+#
+#   python benchmarks/bench_suite.py --tailles 10000 100000 --sortie bench.json
+#   python benchmarks/bench_suite.py --comparer ancien.json nouveau.json
+# À lancer depuis la racine du projet.
+# ------------------------------------------------------------
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RACINE)
+import numpy as np
+
+TAILLES = [10_000, 100_000, 1_000_000, 10_000_000]
+NB_REQUETES = 20
+PRECISIONS_DECK_ANTI = [2, 4, 6]
+
+
+def chrono(fonction, *args, **kwargs):
+    t0 = perf_counter()
+    resultat = fonction(*args, **kwargs)
+    return resultat, perf_counter() - t0
+
+
+def statistiques(durees):
+    durees = np.array(durees) * 1000
+    return {"mediane_ms": round(float(np.median(durees)), 3),
+            "p95_ms": round(float(np.percentile(durees, 95)), 3),
+            "max_ms": round(float(durees.max()), 3)}
+
+
+def memoire_pic_mo():
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pic / (1e6 if sys.platform == "darwin" else 1e3), 1)  # octets sur macOS, Ko sinon
+
+
+def mesurer_taille(path_csv, nb_requetes, graine):
+    """Mesures d'une taille, dans le processus courant (neuf)."""
+    import ia_generative
+    import ia_predictive
+    import stockage_binaire
+    from base_combats import charger_ids_cartes, lire_csv_combats, ouvrir_base
+
+    ids_cartes = charger_ids_cartes()
+    dossier = stockage_binaire.chemin_binaire(path_csv)
+    shutil.rmtree(dossier, ignore_errors=True)
+
+    meta, conversion = chrono(stockage_binaire.synchroniser, path_csv, dossier, ids_cartes)
+    base, ouverture = chrono(ouvrir_base, dossier, meta)
+    _, index = chrono(lambda: base.index.volume("g", [1]))
+    _, agregats = chrono(lambda: base.agregats)
+
+    rng = random.Random(graine)
+    noms = [nom for nom in base.noms_cartes if nom]
+    paires = [(rng.sample(noms[:40], 8), rng.sample(noms[:40], 8)) for _ in range(nb_requetes)]
+
+    requetes = {}
+    for precision in range(1, ia_predictive.NB_PRECISIONS + 1):
+        durees = []
+        for d1, d2 in paires:
+            ia_predictive._cache_combats.entrees.clear()
+            durees.append(chrono(ia_predictive.analyse_combat, d1, d2, precision, base=base)[1])
+        requetes[str(precision)] = statistiques(durees)
+    # même requête servie par le cache
+    ia_predictive.analyse_combat(*paires[0], 5, base=base)
+    cache = statistiques([chrono(ia_predictive.analyse_combat, *paires[0], 5, base=base)[1]
+                          for _ in range(nb_requetes)])
+    # tournoi : tous les duels des 2 x nb_requetes decks en une passe
+    decks = [d for paire in paires for d in paire]
+    tournoi = chrono(ia_predictive.analyse_tournoi, decks, 5, base=base)[1]
+
+    deck_anti = {}
+    for precision in PRECISIONS_DECK_ANTI:
+        durees = [chrono(ia_generative.generer_deck_anti, d1, precision, base=base)[1] for d1, _ in paires]
+        deck_anti[str(precision)] = statistiques(durees)
+    ia_generative.tables_recherche(base)
+    recherche = statistiques([chrono(ia_generative.rechercher_deck_anti, d1, base)[1] for d1, _ in paires])
+
+    # pic du moteur (base binaire), puis avec la lecture complète du CSV en mémoire
+    pic_moteur = memoire_pic_mo()
+    base_csv, lecture_csv = chrono(lire_csv_combats, path_csv, ids_cartes)
+    del base_csv
+
+    taille_bin = sum(os.path.getsize(os.path.join(dossier, f)) for f in os.listdir(dossier))
+    shutil.rmtree(dossier, ignore_errors=True)
+    return {
+        "nb_combats": len(base),
+        "csv_mo": round(os.path.getsize(path_csv) / 1e6, 1),
+        "binaire_mo": round(taille_bin / 1e6, 1),
+        "chargement_s": {
+            "conversion_binaire": round(conversion, 3),
+            "ouverture_memmap": round(ouverture, 4),
+            "index_inverse": round(index, 4),
+            "agregats": round(agregats, 3),
+            "lecture_csv_memoire": round(lecture_csv, 3),
+        },
+        "analyse_combat": requetes,
+        "analyse_combat_cache": cache,
+        "analyse_tournoi_s": {"nb_decks": len(decks), "precision_5": round(tournoi, 4)},
+        "generer_deck_anti": deck_anti,
+        "rechercher_deck_anti": recherche,
+        "memoire_pic_mo": pic_moteur,
+        "memoire_pic_avec_csv_mo": memoire_pic_mo(),
+    }
+
+
+def version_moteur():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RACINE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def lancer(tailles, dossier, nb_requetes, graine):
+    from generateur_combats import generer_csv
+
+    resultats = []
+    for nb in tailles:
+        path = os.path.join(dossier, f"combats_{nb}_{graine}.csv")
+        if not os.path.exists(path):
+            print(f"Génération de {nb} combats...", file=sys.stderr)
+            generer_csv(path, nb, graine)
+
+        # processus neuf : chargement à froid et pic mémoire propres à la taille
+        sortie = subprocess.run([sys.executable, os.path.abspath(__file__), "--mesurer", path,
+                                 "--requetes", str(nb_requetes), "--graine", str(graine)],
+                                cwd=RACINE, capture_output=True, text=True, check=True).stdout
+        resultat = json.loads(sortie)
+        resultats.append(resultat)
+        print(f"{nb:>10} combats : conversion {resultat['chargement_s']['conversion_binaire']:.2f}s, "
+              f"requête p5 {resultat['analyse_combat']['5']['mediane_ms']:.2f} ms, "
+              f"pic {resultat['memoire_pic_mo']} Mo", file=sys.stderr)
+
+    return {
+        "version": version_moteur(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "resultats": resultats,
+    }
+
+
+def comparer(ancien, nouveau):
+    """Rapport nouveau / ancien des médianes, par taille commune."""
+    def valeurs(resultat, prefixe=""):
+        for cle, valeur in resultat.items():
+            if isinstance(valeur, dict):
+                yield from valeurs(valeur, f"{prefixe}{cle}.")
+            elif isinstance(valeur, (int, float)) and not cle.startswith(("p95", "max")):
+                yield prefixe + cle, valeur
+
+    anciens = {r["nb_combats"]: dict(valeurs(r)) for r in ancien["resultats"]}
+    print(f"{ancien.get('version')} -> {nouveau.get('version')} (rapport < 1 : plus rapide / plus petit)")
+    for r in nouveau["resultats"]:
+        if r["nb_combats"] not in anciens:
+            continue
+        print(f"\n{r['nb_combats']} combats")
+        for cle, valeur in valeurs(r):
+            avant = anciens[r["nb_combats"]].get(cle)
+            if avant and cle != "nb_combats":
+                print(f"  {cle:<45} {avant:>10} -> {valeur:>10}  x{valeur / avant:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks du moteur d'analyse")
+    parser.add_argument("--tailles", type=int, nargs="+", default=TAILLES)
+    parser.add_argument("--sortie", help="fichier JSON des résultats (sinon sortie standard)")
+    parser.add_argument("--dossier", help="dossier des CSV générés (réutilisés d'une exécution à l'autre)")
+    parser.add_argument("--requetes", type=int, default=NB_REQUETES, help="paires de decks par mesure")
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--comparer", nargs=2, metavar=("ANCIEN", "NOUVEAU"))
+    parser.add_argument("--mesurer", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.comparer:
+        with open(args.comparer[0], encoding="utf-8") as f1, open(args.comparer[1], encoding="utf-8") as f2:
+            comparer(json.load(f1), json.load(f2))
+        sys.exit()
+
+    if args.mesurer:
+        print(json.dumps(mesurer_taille(args.mesurer, args.requetes, args.graine)))
+        sys.exit()
+
+    if args.dossier:
+        os.makedirs(args.dossier, exist_ok=True)
+        rapport = lancer(args.tailles, args.dossier, args.requetes, args.graine)
+    else:
+        with tempfile.TemporaryDirectory() as dossier:
+            rapport = lancer(args.tailles, dossier, args.requetes, args.graine)
+
+    texte = json.dumps(rapport, indent=2, ensure_ascii=False)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            f.write(texte + "\n")
+    else:
+        print(texte)
@@ -0,0 +1,64 @@
+# Générateur de journaux de combats synthétiques
+# ------------------------------------------------------------
+# Produit un CSV au format exact de recherche_combats.py (20 colonnes)
+# avec des decks tirés parmi les cartes de cartes.csv selon une
+# popularité décroissante (loi de Zipf), pour mesurer les performances
+# sans le vrai combats_joueurs.csv.
+# ------------------------------------------------------------
+
+import csv
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from base_combats import CARTES_FILE, charger_ids_cartes
+
+ENTETE = [
+    "jgagnant", "tropheesg",
+    "cg1", "cg2", "cg3", "cg4", "cg5", "cg6", "cg7", "cg8",
+    "jperdant", "tropheesp",
+    "cp1", "cp2", "cp3", "cp4", "cp5", "cp6", "cp7", "cp8"
+]
+
+TAILLE_BLOC = 100_000
+
+
+def tirer_decks(rng, nb, log_poids):
+    """nb decks de 8 cartes distinctes (astuce de Gumbel : top 8 de log(p) + bruit)."""
+    bruit = rng.gumbel(size=(nb, len(log_poids)))
+    return np.argpartition(-(log_poids + bruit), 8, axis=1)[:, :8]
+
+
+def generer_csv(path, nb_combats, graine=0, exposant_zipf=0.8):
+    """Écrit nb_combats combats synthétiques dans path."""
+    rng = np.random.default_rng(graine)
+    noms = [nom for nom, _ in sorted(charger_ids_cartes(CARTES_FILE).items(), key=lambda x: x[1])]
+    log_poids = -exposant_zipf * np.log(np.arange(1, len(noms) + 1))
+    noms = np.array(noms, dtype=object)
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(ENTETE)
+
+        restant = nb_combats
+        while restant > 0:
+            nb = min(TAILLE_BLOC, restant)
+            cg = noms[tirer_decks(rng, nb, log_poids)]
+            cp = noms[tirer_decks(rng, nb, log_poids)]
+            jg = rng.integers(0, 50_000, nb)
+            jp = rng.integers(0, 50_000, nb)
+            tg = rng.integers(3000, 9000, nb)
+            tp = tg + rng.integers(-300, 300, nb)
+
+            writer.writerows(
+                [f"#J{jg[i]}", tg[i], *cg[i], f"#J{jp[i]}", tp[i], *cp[i]]
+                for i in range(nb)
+            )
+            restant -= nb
+
+
+if __name__ == "__main__":
+    # python benchmarks/generateur_combats.py <sortie.csv> <nb_combats> [graine]
+    generer_csv(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 0)
@@ -0,0 +1,133 @@
+# Cache local des icônes de cartes (interface Streamlit)
+# ------------------------------------------------------------
+# Les icônes viennent de api-assets.clashroyale.com : sans cache, chaque
+# ouverture du sélecteur fait télécharger ~121 images au navigateur.
+# Le préchargement les télécharge une fois, les réduit en vignettes et
+# les range par contenu (nom de fichier = hash des octets) dans
+# images_cartes/cache/, avec un index nom de carte -> fichier.
+#
+# Le téléchargement passe par une fonction recuperer(url) -> octets,
+# remplaçable (tests hors ligne, autre source).
+#
+#   python cache_images.py      -> précharge toutes les icônes
+# ------------------------------------------------------------
+
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+CARTES_ATTRIBUTS = "dataset/clashroyale_cards.csv"
+CACHE_DIR = "images_cartes/cache/"
+INDEX_FILE = "index.json"
+TAILLE_VIGNETTE = 150
+NB_TELECHARGEMENTS = 8
+
+# iconUrls est un dict Python sérialisé : seule l'URL "medium" nous intéresse
+_URL_MEDIUM = re.compile(r"'medium':\s*'([^']+)'")
+
+
+def lire_urls(path=CARTES_ATTRIBUTS):
+    """Nom de carte -> URL de l'icône medium (une regex par ligne au lieu
+    d'ast.literal_eval)."""
+    urls = {}
+    if not os.path.exists(path):
+        return urls
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            trouve = _URL_MEDIUM.search(row.get("iconUrls") or "")
+            if trouve:
+                urls[row["name"]] = trouve.group(1)
+    return urls
+
+
+def telecharger(url, timeout=10):
+    import requests
+
+    reponse = requests.get(url, timeout=timeout)
+    reponse.raise_for_status()
+    return reponse.content
+
+
+def vignette_png(octets, taille=TAILLE_VIGNETTE):
+    """Octets PNG de l'image réduite à taille px de large."""
+    with Image.open(io.BytesIO(octets)) as img:
+        img = img.convert("RGBA")
+        img.thumbnail((taille, taille * 2))
+        sortie = io.BytesIO()
+        img.save(sortie, format="PNG", optimize=True)
+    return sortie.getvalue()
+
+
+def charger_index(dossier=CACHE_DIR):
+    path = os.path.join(dossier, INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _ecrire_index(index, dossier):
+    tmp = os.path.join(dossier, INDEX_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(dossier, INDEX_FILE))
+
+
+def precharger(urls, dossier=CACHE_DIR, recuperer=telecharger, taille=TAILLE_VIGNETTE,
+               nb_workers=NB_TELECHARGEMENTS):
+    """Télécharge les icônes absentes du cache (ou dont l'URL a changé).
+    Retourne (cartes ajoutées, erreurs {nom: message})."""
+    os.makedirs(dossier, exist_ok=True)
+    index = charger_index(dossier)
+    a_faire = {nom: url for nom, url in urls.items()
+               if index.get(nom, {}).get("url") != url
+               or not os.path.exists(os.path.join(dossier, index[nom]["fichier"]))}
+
+    def traiter(nom, url):
+        png = vignette_png(recuperer(url), taille)
+        fichier = hashlib.sha256(png).hexdigest()[:32] + ".png"
+        path = os.path.join(dossier, fichier)
+        if not os.path.exists(path):  # contenu identique -> fichier partagé
+            with open(path + ".tmp", "wb") as f:
+                f.write(png)
+            os.replace(path + ".tmp", path)
+        return fichier
+
+    erreurs = {}
+    with ThreadPoolExecutor(max_workers=nb_workers) as pool:
+        futures = {nom: pool.submit(traiter, nom, url) for nom, url in a_faire.items()}
+        for nom, future in futures.items():
+            try:
+                index[nom] = {"url": a_faire[nom], "fichier": future.result()}
+            except Exception as e:
+                erreurs[nom] = str(e)
+
+    _ecrire_index(index, dossier)
+    return len(a_faire) - len(erreurs), erreurs
+
+
+def chemins_locaux(dossier=CACHE_DIR):
+    """Nom de carte -> chemin de la vignette en cache."""
+    return {nom: os.path.join(dossier, e["fichier"]) for nom, e in charger_index(dossier).items()
+            if os.path.exists(os.path.join(dossier, e["fichier"]))}
+
+
+def data_uri(path):
+    """Vignette en data URI base64, à inclure directement dans le HTML."""
+    with open(path, "rb") as f:
+        return "data:image/png;base64," + base64.b64encode(f.read()).decode("ascii")
+
+
+if __name__ == "__main__":
+    urls = lire_urls()
+    ajoutees, erreurs = precharger(urls)
+    print(f"{ajoutees} icônes ajoutées au cache ({len(chemins_locaux())}/{len(urls)} disponibles)")
+    for nom, message in erreurs.items():
+        print(f"  ❌ {nom} : {message}")
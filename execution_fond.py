@@ -0,0 +1,97 @@
+# Exécution des analyses hors de la boucle Tkinter
+# ------------------------------------------------------------
+# Les analyses (et surtout la première synchronisation de la base, qui
+# relit tout le CSV) tournent dans un thread de travail ; la fenêtre
+# reste réactive et récupère le résultat par root.after.
+#
+# Seule la dernière demande compte : une nouvelle demande annule celles
+# qui n'ont pas commencé, et le résultat d'une demande dépassée est
+# ignoré. Le temps perçu est celui de la dernière demande, pas la somme
+# de toutes celles déclenchées en cochant les cartes.
+# ------------------------------------------------------------
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+INTERVALLE_SONDAGE_MS = 50
+
+
+class Tache:
+    """Vue d'une demande depuis le thread de travail."""
+
+    def __init__(self, executeur, generation):
+        self.executeur = executeur
+        self.generation = generation
+        self.avancement = None  # (lignes traitées, fraction)
+
+    def annulee(self):
+        """Vrai si une demande plus récente a été soumise."""
+        return self.generation != self.executeur.generation
+
+    def progression(self, lignes, fraction):
+        self.avancement = (lignes, fraction)
+
+
+class ExecuteurFond:
+    """Un thread de travail et le sondage du résultat depuis Tk."""
+
+    def __init__(self, root, intervalle_ms=INTERVALLE_SONDAGE_MS):
+        self.root = root
+        self.intervalle_ms = intervalle_ms
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analyse")
+        self.generation = 0
+        self.verrou = threading.Lock()
+        self.courante = None  # (tache, future, quand_fini, quand_progres, quand_erreur)
+        self.sondage_actif = False
+
+    def soumettre(self, fonction, *args, quand_fini, quand_progres=None, quand_erreur=None):
+        """Lance fonction(tache, *args) en arrière-plan ; quand_fini(résultat)
+        est appelé dans la boucle Tk si la demande est toujours la dernière.
+        Les arguments doivent être lus depuis les widgets avant l'appel."""
+        with self.verrou:
+            self.generation += 1
+            tache = Tache(self, self.generation)
+        if self.courante is not None:
+            self.courante[1].cancel()  # sans effet si elle a déjà commencé
+
+        future = self.pool.submit(self._executer, tache, fonction, args)
+        self.courante = (tache, future, quand_fini, quand_progres, quand_erreur)
+        if not self.sondage_actif:
+            self.sondage_actif = True
+            self.root.after(self.intervalle_ms, self._sonder)
+        return tache
+
+    def annuler(self):
+        """Abandonne la demande en cours (son résultat sera ignoré)."""
+        with self.verrou:
+            self.generation += 1
+        if self.courante is not None:
+            self.courante[1].cancel()
+
+    @staticmethod
+    def _executer(tache, fonction, args):
+        if tache.annulee():
+            return None
+        return fonction(tache, *args)
+
+    def _sonder(self):
+        tache, future, quand_fini, quand_progres, quand_erreur = self.courante
+        if not future.done():
+            if quand_progres is not None and tache.avancement is not None:
+                quand_progres(*tache.avancement)
+            self.root.after(self.intervalle_ms, self._sonder)
+            return
+
+        self.sondage_actif = False
+        if future.cancelled() or tache.annulee():
+            return
+        erreur = future.exception()
+        if erreur is None:
+            quand_fini(future.result())
+        elif quand_erreur is not None:
+            quand_erreur(erreur)
+        else:
+            raise erreur
+
+    def fermer(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
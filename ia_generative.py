@@ -1,15 +1,42 @@
-# Nouvelle interface moderne avec deck choisi + deck optimal + précision + scroll molette
+# Nouvelle interface moderne avec deck choisi + deck optimal + temps de recherche + scroll molette
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
 import csv
-import os
-from collections import Counter
+from time import perf_counter
+
+import numpy as np
+
+import scan_parallele
+from atlas_images import TAILLES, Vignettes
+from base_combats import PRIOR_DUEL, charger_base, logit, masque_deck
+from execution_fond import ExecuteurFond
+from ia_predictive import dans_lignes, matrice_duels
+from requete_progressive import RequeteProgressive
 
 CARTES_FILE = "dataset/cartes.csv"
+ATTRIBUTS_FILE = "dataset/clashroyale_cards.csv"
 IMAGES_FOLDER = "images_cartes/"
 DONNEES_COMBATS = "dataset/combats_joueurs.csv"
+SANS_COMBATS = "Aperçu indisponible : aucun combat récupéré pour l'instant."
+
+BUDGET_RECHERCHE = 0.2  # secondes
+LARGEUR_FAISCEAU = 64
+POIDS_SYNERGIE = 0.5
+
+# grille des cartes : cadres de 150 x 180 espacés de 12 px
+GRILLE_COLONNES = 5
+GRILLE_MARGE = 12
+CELLULE_L = 150 + 2 * GRILLE_MARGE
+CELLULE_H = 180 + 2 * GRILLE_MARGE
+
+# cartes qui attaquent les tours (contrainte "condition de victoire")
+CONDITIONS_VICTOIRE = {
+    "Giant", "Royal Giant", "Golem", "Lava Hound", "Balloon", "Hog Rider", "Ram Rider",
+    "Battle Ram", "Royal Hogs", "Miner", "Graveyard", "Goblin Barrel", "X-Bow", "Mortar",
+    "Wall Breakers", "Goblin Giant", "Electro Giant", "Elixir Golem", "Goblin Drill",
+    "Skeleton Barrel", "Three Musketeers", "Rune Giant", "Suspicious Bush",
+}
 
 
 # Charger cartes
@@ -26,25 +53,45 @@ def load_cards():
 
 
 # IA générative
-def generer_deck_anti(deck_user, precision):
-    compteur = Counter()
-    combats = 0
-
-    with open(DONNEES_COMBATS, "r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        next(reader)
+# Les deux sens sont sélectionnés d'un coup sur les masques de la base :
+# - deck utilisateur côté perdant -> on compte les cartes du gagnant
+# - deck utilisateur côté gagnant -> on compte les cartes du perdant
+# (index inversé si les cartes du deck apparaissent dans peu de combats)
+# trophees = (min, max) et ecart_max : comme analyse_combat, seules les
+# lignes de la tranche sont parcourues.
+def generer_deck_anti(deck_user, precision, base=None, trophees=None, ecart_max=None):
+    if base is None:
+        base = charger_base(DONNEES_COMBATS)
+
+    ids = base.ids_deck(deck_user)
+    tranche = base.lignes_tranche(trophees, ecart_max)
+    if base.index_avantageux([("p", ids), ("g", ids)], precision, None if tranche is None else len(tranche)):
+        lignes_g = base.index.lignes_compatibles("p", ids, precision)
+        lignes_p = base.index.lignes_compatibles("g", ids, precision)
+        if tranche is not None:
+            lignes_g = lignes_g[dans_lignes(lignes_g, tranche)]
+            lignes_p = lignes_p[dans_lignes(lignes_p, tranche)]
+    else:
+        masque = masque_deck(ids)
+        lignes_g = np.flatnonzero(base.chevauchement_perdant(masque, tranche) >= precision)
+        lignes_p = np.flatnonzero(base.chevauchement_gagnant(masque, tranche) >= precision)
+        if tranche is not None:
+            lignes_g, lignes_p = tranche[lignes_g], tranche[lignes_p]
+
+    combats = len(lignes_g) + len(lignes_p)
+    if combats == 0:
+        return [], 0
 
-        for row in reader:
-            gagnant = row[2:10]
-            perdant = row[12:20]
+    hist = base.histogramme_cartes(lignes_g, lignes_p)
+    return base.meilleures_cartes(hist, 8), combats
 
-            if len(set(deck_user) & set(perdant)) >= precision:
-                compteur.update(gagnant)
-                combats += 1
 
-            if len(set(deck_user) & set(gagnant)) >= precision:
-                compteur.update(perdant)
-                combats += 1
+# Version de référence : relit le CSV ligne par ligne à chaque appel
+# (en parallèle sur nb_processus processus, voir scan_parallele.py)
+def generer_deck_anti_csv(deck_user, precision, nb_processus=None):
+    compteur, combats = scan_parallele.parcourir(
+        DONNEES_COMBATS, scan_parallele.cartes_morceau, (deck_user, precision),
+        scan_parallele.sommer_cartes, nb_processus)
 
     if combats == 0:
         return [], 0
@@ -52,19 +99,304 @@ def generer_deck_anti(deck_user, precision):
     return [c for c, _ in compteur.most_common(8)], combats
 
 
+# ================================================================
+# Attributs des cartes et contraintes de composition
+# ================================================================
+def charger_attributs(noms_cartes, path=ATTRIBUTS_FILE):
+    """Coût en élixir, légendaire, champion et condition de victoire,
+    en tableaux indexés par id de carte (comme noms_cartes)."""
+    lignes = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            lignes[row["name"]] = row
+
+    elixir = np.full(len(noms_cartes), np.nan)
+    rarete = [""] * len(noms_cartes)
+    for cid, nom in enumerate(noms_cartes):
+        row = lignes.get(nom)
+        if row:
+            rarete[cid] = row["rarity"]
+            if row["elixirCost"]:
+                elixir[cid] = float(row["elixirCost"])
+
+    # Mirror n'a pas de coût fixe (carte précédente + 1) : coût moyen
+    elixir[np.isnan(elixir)] = round(float(np.nanmean(elixir)), 1) if np.isfinite(elixir).any() else 0
+    rarete = np.array(rarete)
+    return {
+        "elixir": elixir,
+        "legendaire": rarete == "legendary",
+        "champion": rarete == "champion",
+        "condition": np.array([nom in CONDITIONS_VICTOIRE for nom in noms_cartes]),
+    }
+
+
+class Contraintes:
+    """Contraintes sur le deck généré (None / False = pas de contrainte)."""
+
+    def __init__(self, elixir_min=None, elixir_max=None, max_legendaires=None, max_champions=None,
+                 condition_victoire=False):
+        self.elixir_min = elixir_min
+        self.elixir_max = elixir_max
+        self.max_legendaires = max_legendaires
+        self.max_champions = max_champions
+        self.condition_victoire = condition_victoire
+
+    def candidats(self, decks, attributs, bornes):
+        """Masque (decks, cartes) des cartes qu'on peut ajouter à chaque deck
+        partiel sans rendre le deck complet impossible. bornes[r] = somme des
+        r coûts jouables les plus faibles / les plus forts."""
+        k = decks.shape[1] + 1
+        reste = 8 - k
+        possible = np.ones((len(decks), len(attributs["elixir"])), dtype=bool)
+
+        if self.elixir_min is not None or self.elixir_max is not None:
+            somme = attributs["elixir"][decks].sum(axis=1)[:, None] + attributs["elixir"][None, :]
+            bas, haut = bornes
+            if self.elixir_max is not None:
+                possible &= somme + bas[reste] <= 8 * self.elixir_max + 1e-9
+            if self.elixir_min is not None:
+                possible &= somme + haut[reste] >= 8 * self.elixir_min - 1e-9
+
+        for cle, limite in (("legendaire", self.max_legendaires), ("champion", self.max_champions)):
+            if limite is not None:
+                nombre = attributs[cle][decks].sum(axis=1)[:, None] + attributs[cle][None, :]
+                possible &= nombre <= limite
+
+        if self.condition_victoire and reste == 0:
+            possible &= attributs["condition"][decks].any(axis=1)[:, None] | attributs["condition"][None, :]
+        return possible
+
+    def echanges(self, deck, attributs):
+        """Masque (8, cartes) des échanges deck[r] -> c qui respectent tout."""
+        possible = np.ones((len(deck), len(attributs["elixir"])), dtype=bool)
+
+        if self.elixir_min is not None or self.elixir_max is not None:
+            e = attributs["elixir"]
+            somme = e[deck].sum() - e[deck][:, None] + e[None, :]
+            if self.elixir_max is not None:
+                possible &= somme <= 8 * self.elixir_max + 1e-9
+            if self.elixir_min is not None:
+                possible &= somme >= 8 * self.elixir_min - 1e-9
+
+        for cle, limite in (("legendaire", self.max_legendaires), ("champion", self.max_champions)):
+            if limite is not None:
+                a = attributs[cle]
+                possible &= a[deck].sum() - a[deck][:, None] + a[None, :] <= limite
+
+        if self.condition_victoire:
+            a = attributs["condition"]
+            possible &= a[deck].sum() - a[deck][:, None] + a[None, :] >= 1
+        return possible
+
+    def respectees(self, deck, attributs):
+        e = attributs["elixir"][deck].mean()
+        return ((self.elixir_min is None or e >= self.elixir_min - 1e-9)
+                and (self.elixir_max is None or e <= self.elixir_max + 1e-9)
+                and (self.max_legendaires is None or attributs["legendaire"][deck].sum() <= self.max_legendaires)
+                and (self.max_champions is None or attributs["champion"][deck].sum() <= self.max_champions)
+                and (not self.condition_victoire or attributs["condition"][deck].any()))
+
+
+# ================================================================
+# Recherche combinatoire du contre-deck
+# ================================================================
+# Score d'un deck D contre le deck utilisateur U, à partir des agrégats :
+#   gain(D)     = moyenne sur c de D, u de U des log-cotes du duel c contre u
+#                 (la prédiction du mode "Duels de cartes")
+#   synergie(D) = moyenne sur les paires {a, b} de D du surplus de log-cotes
+#                 de la paire par rapport à ses deux cartes seules
+#   score = gain + POIDS_SYNERGIE * synergie
+# Le score est additif par carte et par paire : ajouter ou échanger une
+# carte se note pour toutes les cartes candidates d'un coup (numpy).
+_tables_recherche = {}
+
+
+def tables_recherche(base):
+    """(log-cotes des duels, synergies des paires, ids jouables, attributs)
+    par version de la base."""
+    if _tables_recherche.get("signature") != base.signature:
+        log_cotes, _ = matrice_duels(base)
+        agregats = base.agregats
+
+        taux = (agregats.victoires + PRIOR_DUEL / 2) / (agregats.victoires + agregats.defaites + PRIOR_DUEL)
+        paires = (agregats.paires_g + PRIOR_DUEL / 2) / (agregats.paires_g + agregats.paires_p + PRIOR_DUEL)
+        synergies = logit(paires) - (logit(taux)[:, None] + logit(taux)[None, :]) / 2
+        np.fill_diagonal(synergies, 0)
+
+        jouables = np.array([bool(nom) for nom in base.noms_cartes])
+        _tables_recherche.update(signature=base.signature, log_cotes=log_cotes, synergies=synergies,
+                                 jouables=jouables, attributs=charger_attributs(base.noms_cartes))
+    t = _tables_recherche
+    return t["log_cotes"], t["synergies"], t["jouables"], t["attributs"]
+
+
+def _scores(gain, synergies, decks):
+    """Score de chaque deck (lignes de la matrice d'ids decks)."""
+    n = decks.shape[1]
+    paires = synergies[decks[:, :, None], decks[:, None, :]].sum(axis=(1, 2)) / 2
+    return gain[decks].sum(axis=1) / n + POIDS_SYNERGIE * paires / max(n * (n - 1) / 2, 1)
+
+
+def _faisceau(gain, synergies, jouables, largeur, limite, contraintes=None, attributs=None):
+    """Construit les decks carte par carte en gardant les `largeur` meilleurs
+    decks partiels (un seul au-delà de la limite de temps). Les contraintes
+    élaguent les cartes candidates à chaque étape (None si aucun deck ne
+    les respecte)."""
+    if contraintes is not None:
+        couts = np.sort(attributs["elixir"][jouables])
+        bas = np.concatenate([[0], np.cumsum(couts)])
+        haut = np.concatenate([[0], np.cumsum(couts[::-1])])
+        bornes = (bas, haut)
+
+    decks = np.zeros((1, 0), dtype=np.int64)
+    lin = np.zeros(1)
+    paires = np.zeros(1)
+    evalues = 0
+
+    for _ in range(8):
+        # score de chaque deck + chaque carte candidate : (decks, cartes)
+        lin_c = lin[:, None] + gain[None, :]
+        paires_c = paires[:, None] + synergies[decks].sum(axis=1)
+        possible = np.broadcast_to(jouables, lin_c.shape).copy()
+        possible[np.arange(len(decks))[:, None], decks] = False
+        if contraintes is not None:
+            possible &= contraintes.candidats(decks, attributs, bornes)
+
+        k = decks.shape[1] + 1
+        score = np.where(possible, lin_c / k + POIDS_SYNERGIE * paires_c / max(k * (k - 1) / 2, 1), -np.inf)
+        evalues += int(possible.sum())
+
+        n = 1 if perf_counter() > limite else largeur
+        ordre = np.argsort(-score, axis=None, kind="stable")[:4 * n]
+
+        vus = set()
+        retenus = []
+        for pos in ordre:
+            i, c = divmod(int(pos), score.shape[1])
+            if score[i, c] == -np.inf:
+                break
+            cle = frozenset(decks[i].tolist() + [c])
+            if cle not in vus:
+                vus.add(cle)
+                retenus.append((i, c))
+                if len(retenus) == n:
+                    break
+
+        if not retenus:
+            return None, evalues
+        i, c = np.array(retenus).T
+        decks = np.column_stack([decks[i], c])
+        lin, paires = lin_c[i, c], paires_c[i, c]
+
+    meilleur = int(np.argmax(_scores(gain, synergies, decks)))
+    return decks[meilleur], evalues
+
+
+def _ameliorer(deck, gain, synergies, jouables, limite, contraintes=None, attributs=None):
+    """Échanges d'une carte tant qu'ils améliorent le score (et respectent
+    les contraintes)."""
+    evalues = 0
+    while perf_counter() < limite:
+        possible = jouables.copy()
+        possible[deck] = False
+        if not possible.any():
+            break
+
+        # delta[r, c] : gain du remplacement de deck[r] par la carte c
+        reste = np.array([np.delete(deck, r) for r in range(len(deck))])
+        synergie_c = synergies[reste].sum(axis=1)
+        synergie_r = synergies[deck[:, None], reste].sum(axis=1)
+        delta = (gain[None, :] - gain[deck][:, None]) / len(deck) \
+            + POIDS_SYNERGIE * (synergie_c - synergie_r[:, None]) / (len(deck) * (len(deck) - 1) / 2)
+        delta[:, ~possible] = -np.inf
+        if contraintes is not None:
+            delta[~contraintes.echanges(deck, attributs)] = -np.inf
+        evalues += int(possible.sum()) * len(deck)
+
+        r, c = np.unravel_index(np.argmax(delta), delta.shape)
+        if delta[r, c] <= 1e-12:
+            break
+        deck = deck.copy()
+        deck[r] = c
+    return deck, evalues
+
+
+def rechercher_deck_anti(deck_user, base=None, budget=BUDGET_RECHERCHE, largeur=LARGEUR_FAISCEAU,
+                         contraintes=None):
+    """Deck de 8 cartes maximisant le score contre deck_user, dans le budget
+    de temps (secondes, tables de la base déjà calculées), en respectant les
+    contraintes éventuelles. Retourne (deck, % de victoire estimé, decks
+    évalués) ; deck vide si aucun deck ne respecte les contraintes."""
+    if base is None:
+        base = charger_base(DONNEES_COMBATS)
+
+    log_cotes, synergies, jouables, attributs = tables_recherche(base)
+    ids = base.ids_deck(deck_user)
+    if not ids or jouables.sum() < 8:
+        return [], 0, 0
+    debut = perf_counter()
+    gain = log_cotes[:, ids].mean(axis=1)
+
+    # le faisceau dispose de la moitié du budget, les échanges du reste
+    limite = debut + budget
+    deck, evalues = _faisceau(gain, synergies, jouables, largeur, debut + budget / 2, contraintes, attributs)
+    if deck is None:
+        return [], 0, evalues
+    deck, evalues_echanges = _ameliorer(deck, gain, synergies, jouables, limite, contraintes, attributs)
+
+    victoire = 1 / (1 + np.exp(-log_cotes[np.ix_(deck, ids)].mean()))
+    return [base.noms_cartes[c] for c in deck], round(float(victoire) * 100, 2), evalues + evalues_echanges
+
+
+# Recherche exécutée par le thread de travail de l'interface
+def generer(tache, deck_user, budget, contraintes):
+    base = charger_base(DONNEES_COMBATS, progression=tache.progression)
+    if tache.annulee():
+        return None
+    # rechercher_deck_anti renvoie aussi un deck vide dans ces deux cas : on
+    # les signale à part pour ne pas accuser les contraintes
+    if not base.ids_deck(deck_user):
+        raise ValueError("Aucune carte de ton deck n'est connue de la base de combats.")
+    if sum(1 for nom in base.noms_cartes if nom) < 8:
+        raise ValueError("La base de combats connaît moins de 8 cartes.")
+    return rechercher_deck_anti(deck_user, base, budget=budget, contraintes=contraintes)
+
+
+# Préparation de l'aperçu des decks partiels (chargement de la base et
+# de l'index hors de la boucle Tk)
+def preparer_apercu(tache):
+    """Requête progressive sur la base, ou None sans données de combats
+    (pas de fichier, ou fichier tout juste créé par le crawler)."""
+    try:
+        base = charger_base(DONNEES_COMBATS, progression=tache.progression)
+    except FileNotFoundError:
+        return None
+    if len(base) == 0:
+        return None
+    base.index
+    return RequeteProgressive(base)
+
+
 class IA_Generative_App:
 
     def __init__(self, root):
         self.root = root
         self.cards = load_cards()
         self.selected_cards = []
-        self.card_widgets = []
-        self.images_cache = {}
+        self.requete = None  # aperçu des decks partiels
+        self.apercu_possible = True  # faux si aucune donnée de combats
+
+        # vignettes des deux tailles affichées, chargées d'un bloc depuis l'atlas
+        noms = [name for _, name in self.cards]
+        self.vignettes = {taille: Vignettes(noms, taille, IMAGES_FOLDER) for taille in TAILLES}
 
         root.title("IA Générative Clash Royale - Interface Moderne")
         root.geometry("1200x800")
         root.configure(bg="#121212")
 
+        self.executeur = ExecuteurFond(root)
+        root.protocol("WM_DELETE_WINDOW", self.fermer)
+
         self.build_ui()
 
     def build_ui(self):
@@ -72,36 +404,58 @@ class IA_Generative_App:
                          bg="#121212", font=("Arial", 22, "bold"))
         title.pack(pady=10)
 
-        # Sélecteur précision
+        # Sélecteur du temps de recherche
         p_frame = tk.Frame(self.root, bg="#121212")
         p_frame.pack(pady=5)
-        tk.Label(p_frame, text="Précision :", fg="white", bg="#121212", font=("Arial", 14)).pack(side="left")
-
-        self.precision_var = tk.IntVar(value=5)
-        self.precision_box = ttk.Combobox(p_frame, textvariable=self.precision_var,
-                                          values=list(range(1, 9)), width=5)
-        self.precision_box.pack(side="left", padx=5)
-
-        # Scroll Frame
+        tk.Label(p_frame, text="Temps de recherche (ms) :", fg="white", bg="#121212",
+                 font=("Arial", 14)).pack(side="left")
+
+        self.budget_var = tk.IntVar(value=int(BUDGET_RECHERCHE * 1000))
+        self.budget_box = ttk.Combobox(p_frame, textvariable=self.budget_var,
+                                       values=[50, 100, 200, 500, 1000], width=5)
+        self.budget_box.pack(side="left", padx=5)
+
+        # Contraintes de composition ("-" = libre)
+        tk.Label(p_frame, text="Élixir moyen :", fg="white", bg="#121212",
+                 font=("Arial", 14)).pack(side="left", padx=(20, 0))
+        self.elixir_min_var = tk.StringVar(value="-")
+        self.elixir_max_var = tk.StringVar(value="-")
+        valeurs_elixir = ["-"] + [f"{e / 10:.1f}" for e in range(25, 51, 5)]
+        for var in (self.elixir_min_var, self.elixir_max_var):
+            ttk.Combobox(p_frame, textvariable=var, values=valeurs_elixir, width=4,
+                         state="readonly").pack(side="left", padx=2)
+
+        tk.Label(p_frame, text="Légendaires max :", fg="white", bg="#121212",
+                 font=("Arial", 14)).pack(side="left", padx=(20, 0))
+        self.legendaires_var = tk.StringVar(value="-")
+        ttk.Combobox(p_frame, textvariable=self.legendaires_var, values=["-", 0, 1, 2, 3, 4],
+                     width=3, state="readonly").pack(side="left", padx=5)
+
+        self.condition_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(p_frame, text="Condition de victoire", variable=self.condition_var,
+                       fg="white", bg="#121212", selectcolor="#121212",
+                       font=("Arial", 14)).pack(side="left", padx=(20, 0))
+
+        # Scroll Frame : grille virtuelle, seules les lignes visibles ont des widgets
         container = tk.Frame(self.root)
         container.pack(fill="both", expand=True)
 
         self.canvas = tk.Canvas(container, bg="#121212", highlightthickness=0)
         self.canvas.pack(side="left", fill="both", expand=True)
 
-        scrollbar = ttk.Scrollbar(container, orient="vertical", command=self.canvas.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.canvas.configure(yscrollcommand=scrollbar.set)
-
-        self.grid_frame = tk.Frame(self.canvas, bg="#121212")
-        self.canvas.create_window((0, 0), window=self.grid_frame, anchor="nw")
-
-        self.grid_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+        self.scrollbar = ttk.Scrollbar(container, orient="vertical", command=self.canvas.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+        self.canvas.bind("<Configure>", lambda e: self.display_cards_grid())
 
         # Molette de souris
         self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
 
-        self.display_cards_grid()
+        lignes = (len(self.cards) + GRILLE_COLONNES - 1) // GRILLE_COLONNES
+        self.canvas.configure(scrollregion=(0, 0, GRILLE_COLONNES * CELLULE_L + GRILLE_MARGE,
+                                            lignes * CELLULE_H + GRILLE_MARGE))
+        self.cellules = {}  # index de carte -> cellule affichée
+        self.cellules_libres = []
 
         # --- NOUVEAU : zone deck choisi ---
         self.deck_frame = tk.Frame(self.root, bg="#121212")
@@ -112,6 +466,7 @@ class IA_Generative_App:
 
         self.deck_cards_frame = tk.Frame(self.deck_frame, bg="#121212")
         self.deck_cards_frame.pack()
+        self.deck_slots = self._creer_bande(self.deck_cards_frame)
 
         # --- NOUVEAU : zone deck optimal ---
         self.optimal_frame = tk.Frame(self.root, bg="#121212")
@@ -121,47 +476,95 @@ class IA_Generative_App:
                                       font=("Arial", 16, "bold"))
         self.optimal_title.pack()
 
+        self.progress = ttk.Progressbar(self.optimal_frame, mode="determinate", maximum=100, length=400)
+        self.progress.pack(pady=(0, 5))
+
         self.optimal_cards_frame = tk.Frame(self.optimal_frame, bg="#121212")
         self.optimal_cards_frame.pack()
+        self.optimal_slots = self._creer_bande(self.optimal_cards_frame)
 
     def _on_mousewheel(self, event):
         self.canvas.yview_scroll(-1 * (event.delta // 120), "units")
 
-    def load_card_image(self, card_name, size=120):
-        img_path = os.path.join(IMAGES_FOLDER, f"{card_name}.png")
-        if not os.path.exists(img_path):
-            img_path = os.path.join(IMAGES_FOLDER, "vide.png")
-
-        key = f"{img_path}_{size}"
-        if key not in self.images_cache:
-            img = Image.open(img_path).resize((size, size))
-            self.images_cache[key] = ImageTk.PhotoImage(img)
-
-        return self.images_cache[key]
+    def _on_scroll(self, *args):
+        self.scrollbar.set(*args)
+        self.display_cards_grid()
 
     def display_cards_grid(self):
-        cols = 5
-        for idx, (cid, name) in enumerate(self.cards):
-            row = idx // cols
-            col = idx % cols
-
-            frame = tk.Frame(self.grid_frame, bg="#1e1e1e", padx=5, pady=5,
-                             highlightthickness=2, highlightbackground="#333",
-                             width=150, height=180)
-            frame.grid(row=row, column=col, padx=12, pady=12)
-            frame.pack_propagate(False)
-
-            img = self.load_card_image(name)
-            img_label = tk.Label(frame, image=img, bg="#1e1e1e")
+        # lignes visibles (plus une de marge) : les cellules sorties de la
+        # fenêtre sont recyclées pour les cartes qui y entrent
+        haut = self.canvas.canvasy(0)
+        bas = haut + self.canvas.winfo_height()
+        premiere = max(int(haut // CELLULE_H) - 1, 0)
+        derniere = int(bas // CELLULE_H) + 1
+        visibles = set(range(premiere * GRILLE_COLONNES,
+                             min((derniere + 1) * GRILLE_COLONNES, len(self.cards))))
+
+        for idx in list(self.cellules):
+            if idx not in visibles:
+                cellule = self.cellules.pop(idx)
+                self.canvas.itemconfigure(cellule["fenetre"], state="hidden")
+                self.cellules_libres.append(cellule)
+
+        for idx in sorted(visibles - set(self.cellules)):
+            cellule = self.cellules_libres.pop() if self.cellules_libres else self._creer_cellule()
+            self._remplir_cellule(cellule, idx)
+            self.cellules[idx] = cellule
+
+    def _creer_cellule(self):
+        frame = tk.Frame(self.canvas, bg="#1e1e1e", padx=5, pady=5,
+                         highlightthickness=2, highlightbackground="#333",
+                         width=150, height=180)
+        frame.pack_propagate(False)
+
+        img_label = tk.Label(frame, bg="#1e1e1e")
+        img_label.pack()
+
+        name_label = tk.Label(frame, fg="white", bg="#1e1e1e", font=("Arial", 11))
+        name_label.pack(pady=4)
+
+        cellule = {"frame": frame, "image": img_label, "nom": name_label, "carte": None,
+                   "fenetre": self.canvas.create_window(0, 0, window=frame, anchor="nw")}
+        for widget in (frame, img_label, name_label):
+            widget.bind("<Button-1>", lambda e, c=cellule: self.toggle_card(c["carte"], c["frame"]))
+        return cellule
+
+    def _remplir_cellule(self, cellule, idx):
+        name = self.cards[idx][1]
+        cellule["carte"] = name
+        cellule["image"].config(image=self.vignettes[120][name])
+        cellule["nom"].config(text=name)
+        selectionnee = name in self.selected_cards
+        cellule["frame"].config(highlightbackground="#00bfff" if selectionnee else "#333")
+
+        row, col = divmod(idx, GRILLE_COLONNES)
+        self.canvas.coords(cellule["fenetre"], GRILLE_MARGE + col * CELLULE_L, GRILLE_MARGE + row * CELLULE_H)
+        self.canvas.itemconfigure(cellule["fenetre"], state="normal")
+
+    # --- bandes de 8 cartes (deck choisi, deck optimal) : widgets réutilisés ---
+    def _creer_bande(self, parent):
+        slots = []
+        for _ in range(8):
+            frame = tk.Frame(parent, bg="#1e1e1e", padx=3, pady=3)
+            img_label = tk.Label(frame, bg="#1e1e1e")
             img_label.pack()
-
-            name_label = tk.Label(frame, text=name, fg="white", bg="#1e1e1e", font=("Arial", 11))
-            name_label.pack(pady=4)
-
-            for widget in (frame, img_label, name_label):
-                widget.bind("<Button-1>", lambda e, n=name, w=frame: self.toggle_card(n, w))
-
-            self.card_widgets.append((name, frame))
+            name_label = tk.Label(frame, fg="white", bg="#1e1e1e", font=("Arial", 10))
+            name_label.pack()
+            slots.append((frame, img_label, name_label))
+        return slots
+
+    def _remplir_bande(self, slots, deck):
+        # les emplacements affichés forment toujours un préfixe : l'ordre est conservé
+        for i, (frame, img_label, name_label) in enumerate(slots):
+            if i < len(deck):
+                img_label.config(image=self.vignettes[60][deck[i]])
+                name_label.config(text=deck[i])
+                # winfo_manager et non winfo_ismapped : une bande pas encore
+                # affichée (fenêtre non dessinée) serait sinon ré-empaquetée
+                if not frame.winfo_manager():
+                    frame.pack(side="left", padx=5)
+            elif frame.winfo_manager():
+                frame.pack_forget()
 
     def toggle_card(self, card_name, widget):
         if card_name in self.selected_cards:
@@ -178,11 +581,53 @@ class IA_Generative_App:
 
         if len(self.selected_cards) == 8:
             self.run_ia()
+        elif not self.apercu_possible:
+            self.afficher_sans_combats()
+        elif self.requete is None:
+            self.progress.config(mode="indeterminate")
+            self.progress.start()
+            self.executeur.soumettre(preparer_apercu, quand_fini=self.initialiser_apercu,
+                                     quand_progres=self.afficher_progression, quand_erreur=self.afficher_erreur)
+        else:
+            self.executeur.annuler()
+            self.arreter_progression()
+            self.afficher_apercu()
+
+    # --- aperçu pendant la construction du deck ---
+    def initialiser_apercu(self, requete):
+        self.arreter_progression()
+        if requete is None:
+            self.apercu_possible = False
+            self.afficher_sans_combats()
+            return
+        self.requete = requete
+        self.afficher_apercu()
+
+    def afficher_sans_combats(self):
+        self.display_optimal_deck([], "")
+        self.optimal_title.config(text=SANS_COMBATS if self.selected_cards else "")
+
+    def afficher_apercu(self):
+        # la requête ne traite que les cartes ajoutées ou retirées depuis le dernier appel
+        self.requete.definir(self.selected_cards)
+        if not self.selected_cards:
+            self.display_optimal_deck([], "")
+            return
+
+        combats, victoire = self.requete.resultat()
+        if combats == 0:
+            self.display_optimal_deck([], "")
+            self.optimal_title.config(text="Aperçu : aucun combat avec ces cartes.")
+            return
+
+        self.display_optimal_deck(
+            self.requete.contre_cartes(8),
+            f"Aperçu ({len(self.selected_cards)}/8) : {victoire}% de victoires sur {combats} combats, "
+            f"cartes qui battent ce début de deck")
 
     # --- NOUVEAU : affichage du deck choisi ---
     def update_deck_display(self):
-        for w in self.deck_cards_frame.winfo_children():
-            w.destroy()
+        self._remplir_bande(self.deck_slots, self.selected_cards)
 
         if len(self.selected_cards) == 0:
             self.deck_title.config(text="")
@@ -190,42 +635,58 @@ class IA_Generative_App:
 
         self.deck_title.config(text=f"Deck sélectionné : {len(self.selected_cards)}/8 cartes")
 
-        for name in self.selected_cards:
-            frame = tk.Frame(self.deck_cards_frame, bg="#1e1e1e", padx=3, pady=3)
-            frame.pack(side="left", padx=5)
-
-            img = self.load_card_image(name, size=60)
-            tk.Label(frame, image=img, bg="#1e1e1e").pack()
-            tk.Label(frame, text=name, fg="white", bg="#1e1e1e", font=("Arial", 10)).pack()
-
     # --- NOUVEAU : affichage du deck optimal ---
-    def display_optimal_deck(self, deck):
-        for w in self.optimal_cards_frame.winfo_children():
-            w.destroy()
-
-        if not deck:
-            self.optimal_title.config(text="")
-            return
+    def display_optimal_deck(self, deck, titre):
+        self._remplir_bande(self.optimal_slots, deck)
+        self.optimal_title.config(text=titre if deck else "")
 
-        self.optimal_title.config(text="Deck optimal contre ton deck")
+    def contraintes(self):
+        def valeur(var, type_):
+            return None if var.get() == "-" else type_(var.get())
 
-        for name in deck:
-            frame = tk.Frame(self.optimal_cards_frame, bg="#1e1e1e", padx=3, pady=3)
-            frame.pack(side="left", padx=5)
-
-            img = self.load_card_image(name, size=60)
-            tk.Label(frame, image=img, bg="#1e1e1e").pack()
-            tk.Label(frame, text=name, fg="white", bg="#1e1e1e", font=("Arial", 10)).pack()
+        return Contraintes(elixir_min=valeur(self.elixir_min_var, float),
+                           elixir_max=valeur(self.elixir_max_var, float),
+                           max_legendaires=valeur(self.legendaires_var, int),
+                           condition_victoire=self.condition_var.get())
 
     def run_ia(self):
-        precision = self.precision_var.get()
-        suggested, combats = generer_deck_anti(self.selected_cards, precision)
-
-        if combats == 0:
-            self.optimal_title.config(text="Aucun combat correspondant trouvé.")
+        # les widgets ne se lisent que depuis la boucle Tk
+        budget = self.budget_var.get() / 1000
+        self.optimal_title.config(text="Recherche en cours...")
+        self.progress.config(mode="indeterminate")
+        self.progress.start()
+        self.executeur.soumettre(generer, list(self.selected_cards), budget, self.contraintes(),
+                                 quand_fini=self.afficher_resultat, quand_progres=self.afficher_progression,
+                                 quand_erreur=self.afficher_erreur)
+
+    def afficher_progression(self, lignes, fraction):
+        self.progress.stop()
+        self.progress.config(mode="determinate", value=fraction * 100)
+        self.optimal_title.config(text=f"Chargement des combats : {lignes} lignes traitées...")
+
+    def arreter_progression(self):
+        self.progress.stop()
+        self.progress.config(mode="determinate", value=0)
+
+    def afficher_resultat(self, resultat):
+        self.arreter_progression()
+        suggested, victoire, _ = resultat
+
+        if not suggested:
+            self.display_optimal_deck([], "")
+            self.optimal_title.config(text="Aucun deck ne respecte les contraintes.")
             return
 
-        self.display_optimal_deck(suggested)
+        self.display_optimal_deck(suggested, f"Deck optimal contre ton deck (victoire estimée : {victoire}%)")
+
+    def afficher_erreur(self, erreur):
+        self.arreter_progression()
+        self.optimal_title.config(text="Recherche impossible.")
+        messagebox.showerror("Erreur", str(erreur))
+
+    def fermer(self):
+        self.executeur.fermer()
+        self.root.destroy()
 
 
 if __name__ == "__main__":
@@ -6,10 +6,33 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import csv
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import instrumentation
+import scan_parallele
+from base_combats import PRIOR_DUEL, RATIO_INDEX_DUEL, charger_base, logit, masque_deck, popcount
+from execution_fond import ExecuteurFond
+from modele_matchup import MODELE_FILE, ModeleMatchup
 
 CARTES_FILE = "dataset/cartes.csv"
 DONNEES_COMBATS = "dataset/combats_joueurs.csv"
 
+NB_PRECISIONS = 8
+CACHE_TAILLE_MAX = 4096  # entrées (deck a, deck b, précision)
+MIN_COMBATS_SIGNIFICATIFS = 30  # échantillon minimal pour choisir une précision
+TAILLE_BLOC_TOURNOI = 1 << 16  # lignes par bloc du tournoi (produit matriciel exact en float32)
+
+MODE_COMBATS = "Combats similaires"
+MODE_CARTES = "Duels de cartes"
+MODE_MODELE = "Modèle appris"
+MODES = [MODE_COMBATS, MODE_CARTES, MODE_MODELE]
+
+INVITE_SELECTION = "Sélectionnez 8 cartes pour chaque deck..."
+
 # ================================================================
 # Charger toutes les cartes depuis cartes.csv
 # ================================================================
@@ -29,34 +52,303 @@ def load_cards():
 # ================================================================
 # Analyse double sens avec précision (1 à 8)
 # ------------------------------------------------
-def analyse_combat(deck1_names, deck2_names, precision):
-    combats_selectionnes = 0
-    vic_d1 = 0
-    vic_d2 = 0
+# Les decks sont comparés aux masques 128 bits de la base de combats
+# (chargée une seule fois) : un popcount vectorisé donne le nombre de
+# cartes communes avec chaque deck gagnant / perdant. Quand les cartes
+# demandées apparaissent dans peu de combats, on fusionne plutôt leurs
+# listes dans l'index inversé (coût proportionnel aux candidats).
+#
+# Un combat est retenu à la précision p si min(communes gagnant,
+# communes perdant) >= p : l'histogramme de ce minimum donne donc les
+# victoires pour les 8 précisions en une seule passe.
+#
+# lignes (triées) restreint l'analyse à une tranche de trophées : le
+# parcours ne porte que sur ces lignes, l'index n'en garde que celles-ci.
+# progression(lignes, fraction) suit le parcours des masques, bloc par bloc.
+def victoires_par_precision(base, ids_d1, ids_d2, lignes=None, progression=None):
+    """vic_d1[p], vic_d2[p] : victoires de chaque deck à la précision p (0 à 9)."""
+    requetes = [("g", ids_d1), ("p", ids_d2), ("g", ids_d2), ("p", ids_d1)]
+    if base.index_avantageux(requetes, 1, None if lignes is None else len(lignes), ratio=RATIO_INDEX_DUEL):
+        instrumentation.compter("analyse_chemin", chemin="index")
+        hist_d1 = _histogramme_index(base, ids_d1, ids_d2, lignes)
+        hist_d2 = _histogramme_index(base, ids_d2, ids_d1, lignes)
+    else:
+        # 4 popcounts sur toutes les lignes (de la tranche), en un passage
+        instrumentation.compter("analyse_chemin", chemin="masques")
+        instrumentation.compter("lignes_parcourues", 4 * (len(base) if lignes is None else len(lignes)))
+        hist_d1, hist_d2 = base.histogrammes_duel(masque_deck(ids_d1), masque_deck(ids_d2), lignes, progression)
+
+    # vic[p] = combats dont le minimum est >= p ; vic[9] = 0
+    vic_d1 = np.append(np.cumsum(hist_d1[::-1])[::-1], 0)
+    vic_d2 = np.append(np.cumsum(hist_d2[::-1])[::-1], 0)
+    return vic_d1, vic_d2
+
+
+def _histogramme_index(base, ids_gagnant, ids_perdant, lignes=None):
+    lignes_g, comptes_g = base.index.chevauchements("g", ids_gagnant)
+    lignes_p, comptes_p = base.index.chevauchements("p", ids_perdant)
+    instrumentation.compter("lignes_parcourues", len(lignes_g) + len(lignes_p))
+    communes, ig, ip = np.intersect1d(lignes_g, lignes_p, assume_unique=True, return_indices=True)
+    if lignes is not None:
+        dans_tranche = dans_lignes(communes, lignes)
+        ig, ip = ig[dans_tranche], ip[dans_tranche]
+    hist = np.bincount(np.minimum(comptes_g[ig], comptes_p[ip]), minlength=NB_PRECISIONS + 1)
+    hist[0] = (len(base) if lignes is None else len(lignes)) - len(ig)
+    return hist
+
+
+def dans_lignes(valeurs, lignes):
+    """Masque des valeurs présentes dans le tableau trié lignes."""
+    pos = np.searchsorted(lignes, valeurs)
+    return (pos < len(lignes)) & (lignes[np.minimum(pos, len(lignes) - 1)] == valeurs) if len(lignes) \
+        else np.zeros(len(valeurs), dtype=bool)
+
+
+def _a_precision(vic, precision):
+    return int(vic[min(max(precision, 0), len(vic) - 1)])
+
+
+class CacheCombats:
+    """Cache LRU des victoires (vic_a, vic_b) par (deck a, deck b, précision,
+    tranche de trophées).
+
+    Les decks sont des tuples d'ids triés, avec a <= b : analyser (d2, d1)
+    revient à analyser (d1, d2) en échangeant les deux résultats. Le cache
+    est vidé dès que la signature de la base change : (version, nb_lignes)
+    du dossier binaire pour charger_base, qui change à chaque ajout de
+    combats ou reconversion ; taille / date du fichier seulement pour une
+    base lue directement du CSV (lire_csv_combats).
+    """
+
+    def __init__(self, taille_max=CACHE_TAILLE_MAX):
+        self.taille_max = taille_max
+        self.entrees = OrderedDict()
+        self.signature = None
+        self.verrou = threading.Lock()
+
+    def lire(self, signature, cle):
+        with self.verrou:
+            if signature != self.signature:
+                self.entrees.clear()
+                self.signature = signature
+                return None
+            valeur = self.entrees.get(cle)
+            if valeur is not None:
+                self.entrees.move_to_end(cle)
+            return valeur
+
+    def ecrire(self, signature, cle, valeur):
+        with self.verrou:
+            if signature != self.signature:
+                return
+            self.entrees[cle] = valeur
+            self.entrees.move_to_end(cle)
+            while len(self.entrees) > self.taille_max:
+                self.entrees.popitem(last=False)
+
+
+_cache_combats = CacheCombats()
+
+
+def _victoires(base, deck1_names, deck2_names, precisions, trophees=None, ecart_max=None, progression=None):
+    """[(vic_d1, vic_d2) pour chaque précision], via le cache si possible."""
+    with instrumentation.tracer("analyse_combat", precisions=len(precisions), trophees=trophees,
+                                ecart_max=ecart_max, nb_combats=len(base)):
+        with instrumentation.chrono("analyse_decks"):
+            ids_d1 = tuple(sorted(base.ids_deck(deck1_names)))
+            ids_d2 = tuple(sorted(base.ids_deck(deck2_names)))
+        inverse = ids_d2 < ids_d1
+        deck_a, deck_b = (ids_d2, ids_d1) if inverse else (ids_d1, ids_d2)
+        tranche = (None if trophees is None else tuple(trophees), ecart_max)
+
+        victoires = [_cache_combats.lire(base.signature, (deck_a, deck_b, p, tranche)) for p in precisions]
+        if any(v is None for v in victoires):
+            instrumentation.compter("cache_combats", resultat="absent")
+            with instrumentation.chrono("analyse_tranche"):
+                lignes = base.lignes_tranche(trophees, ecart_max)
+            with instrumentation.chrono("analyse_intersection"):
+                vic_a, vic_b = victoires_par_precision(base, deck_a, deck_b, lignes, progression)
+            for p in range(1, NB_PRECISIONS + 1):
+                _cache_combats.ecrire(base.signature, (deck_a, deck_b, p, tranche),
+                                      (_a_precision(vic_a, p), _a_precision(vic_b, p)))
+            victoires = [(_a_precision(vic_a, p), _a_precision(vic_b, p)) for p in precisions]
+        else:
+            instrumentation.compter("cache_combats", resultat="present")
+
+    return [v[::-1] if inverse else v for v in victoires]
+
+
+# trophees = (min, max) : seuls les combats où les deux joueurs sont dans
+# cette tranche ; ecart_max : écart de trophées maximal entre eux.
+def analyse_combat(deck1_names, deck2_names, precision, base=None, trophees=None, ecart_max=None,
+                   progression=None):
+    if base is None:
+        base = charger_base(DONNEES_COMBATS)
+
+    (vic_d1, vic_d2), = _victoires(base, deck1_names, deck2_names, [precision], trophees, ecart_max,
+                                   progression)
+    return resultat_combat(vic_d1 + vic_d2, vic_d1, vic_d2)
+
+
+# Toutes les précisions d'un coup
+# ------------------------------------------------
+# Même passe que analyse_combat : renvoie [(précision, combats, p1, p2)]
+# pour les précisions 1 à 8.
+def analyse_combat_toutes_precisions(deck1_names, deck2_names, base=None, trophees=None, ecart_max=None):
+    if base is None:
+        base = charger_base(DONNEES_COMBATS)
 
-    with open(DONNEES_COMBATS, "r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        next(reader)
-        for row in reader:
-            w_cards = row[2:10]   # 8 cartes vainqueur
-            l_cards = row[12:20]  # 8 cartes perdant
-
-            # ----------------------------
-            # Vérification sens Deck1 -> gagnant
-            # ----------------------------
-            if (len(set(deck1_names) & set(w_cards)) >= precision and
-                len(set(deck2_names) & set(l_cards)) >= precision):
-                vic_d1 += 1
-                combats_selectionnes += 1
-
-            # ----------------------------
-            # Vérification sens Deck2 -> gagnant
-            # ----------------------------
-            if (len(set(deck2_names) & set(w_cards)) >= precision and
-                len(set(deck1_names) & set(l_cards)) >= precision):
-                vic_d2 += 1
-                combats_selectionnes += 1
+    precisions = list(range(1, NB_PRECISIONS + 1))
+    victoires = _victoires(base, deck1_names, deck2_names, precisions, trophees, ecart_max)
+    return [(p, *resultat_combat(vic_d1 + vic_d2, vic_d1, vic_d2))
+            for p, (vic_d1, vic_d2) in zip(precisions, victoires)]
+
+
+def precision_recommandee(resultats, min_combats=MIN_COMBATS_SIGNIFICATIFS):
+    """Plus haute précision avec au moins min_combats combats (None sinon)."""
+    for precision, combats, _, _ in reversed(resultats):
+        if combats >= min_combats:
+            return precision
+    return None
+
+
+# ================================================================
+# Tournoi : tous les duels d'une liste de decks
+# ================================================================
+# Une seule passe sur les combats, par blocs de lignes. Pour un bloc :
+# G[l, i] = le gagnant de la ligne l a au moins `precision` cartes du
+# deck i, P[l, j] = idem pour le perdant et le deck j. Alors (Gᵀ P)[i, j]
+# compte les victoires du deck i sur le deck j dans le bloc : chaque
+# combat est attribué d'un coup à tous les couples de decks qu'il
+# concerne, au lieu de N² analyses séparées.
+def victoires_tournoi(base, decks_ids, precision, lignes=None):
+    """Matrice (N, N) : victoires[i, j] = combats gagnés par le deck i
+    contre le deck j à cette précision (lignes : tranche de trophées)."""
+    masques = [masque_deck(ids) for ids in decks_ids]
+    bas = np.array([m[0] for m in masques], dtype=np.uint64)
+    haut = np.array([m[1] for m in masques], dtype=np.uint64)
+    victoires = np.zeros((len(decks_ids), len(decks_ids)), dtype=np.int64)
+
+    nb_lignes = len(base) if lignes is None else len(lignes)
+    for debut in range(0, nb_lignes, TAILLE_BLOC_TOURNOI):
+        bloc = slice(debut, debut + TAILLE_BLOC_TOURNOI) if lignes is None \
+            else lignes[debut:debut + TAILLE_BLOC_TOURNOI]
+        gagnants = (popcount(np.asarray(base.masque_g_bas[bloc])[:, None] & bas)
+                    + popcount(np.asarray(base.masque_g_haut[bloc])[:, None] & haut)) >= precision
+        perdants = (popcount(np.asarray(base.masque_p_bas[bloc])[:, None] & bas)
+                    + popcount(np.asarray(base.masque_p_haut[bloc])[:, None] & haut)) >= precision
+        victoires += (gagnants.T.astype(np.float32) @ perdants.astype(np.float32)).astype(np.int64)
+
+    instrumentation.compter("lignes_parcourues", 2 * nb_lignes)
+    return victoires
+
+
+def analyse_tournoi(decks, precision, base=None, trophees=None, ecart_max=None):
+    """Duels de tous les couples de decks : (combats, pourcentages),
+    matrices (N, N). combats[i, j] = combats retenus entre les decks i et j
+    (comptés double sens, comme analyse_combat), pourcentages[i, j] = % de
+    victoires du deck i contre le deck j (0 sans combat)."""
+    if base is None:
+        base = charger_base(DONNEES_COMBATS)
+
+    with instrumentation.tracer("analyse_tournoi", decks=len(decks), precision=precision,
+                                trophees=trophees, ecart_max=ecart_max, nb_combats=len(base)):
+        lignes = base.lignes_tranche(trophees, ecart_max)
+        victoires = victoires_tournoi(base, [base.ids_deck(d) for d in decks], precision, lignes)
+
+    combats = victoires + victoires.T
+    pourcentages = np.round(100 * victoires / np.maximum(combats, 1), 2)
+    return combats, pourcentages
+
+
+def exporter_tournoi(path, decks, combats, pourcentages, noms=None):
+    """CSV d'un tournoi, une ligne par couple de decks (i < j) : mêmes
+    valeurs que analyse_combat(deck_1, deck_2, precision)."""
+    if noms is None:
+        noms = [f"Deck {i + 1}" for i in range(len(decks))]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["deck_1", "deck_2", "combats", "victoire_deck_1", "victoire_deck_2",
+                         "cartes_deck_1", "cartes_deck_2"])
+        for i in range(len(decks)):
+            for j in range(i + 1, len(decks)):
+                writer.writerow([noms[i], noms[j], int(combats[i, j]), float(pourcentages[i, j]),
+                                 float(pourcentages[j, i]), " | ".join(decks[i]), " | ".join(decks[j])])
+
+
+# ================================================================
+# Mode rapide : duels carte contre carte
+# ================================================================
+# Les agrégats de la base comptent, pour chaque couple de cartes (a, b),
+# les combats où a était chez le gagnant et b chez le perdant. Chaque
+# duel est estimé en lissant ce taux vers un a priori issu des taux de
+# victoire de a et de b seules ; la prédiction combine les 64 duels
+# (moyenne des log-cotes). Matrice calculée une fois par version.
+_matrice_duels = {}
+
+
+def matrice_duels(base):
+    """(log-cotes[a, b] que a batte b, combats observés[a, b]) pour la base."""
+    if _matrice_duels.get("signature") != base.signature:
+        agregats = base.agregats
+        victoires = agregats.victoires.astype(float)
+        parties = victoires + agregats.defaites
+        taux = np.where(parties > 0, victoires / np.maximum(parties, 1), 0.5)
+
+        gagnes = agregats.duels.astype(float)
+        observes = gagnes + gagnes.T
+        a_priori = 1 / (1 + np.exp(-(logit(taux)[:, None] - logit(taux)[None, :])))
+        estime = (gagnes + PRIOR_DUEL * a_priori) / (observes + PRIOR_DUEL)
+
+        _matrice_duels.update(signature=base.signature, log_cotes=logit(estime), observes=observes)
+    return _matrice_duels["log_cotes"], _matrice_duels["observes"]
+
+
+def analyse_par_cartes(deck1_names, deck2_names, base=None):
+    """Même retour qu'analyse_combat : (duels observés, % Deck 1, % Deck 2)."""
+    if base is None:
+        base = charger_base(DONNEES_COMBATS)
+
+    ids_d1 = base.ids_deck(deck1_names)
+    ids_d2 = base.ids_deck(deck2_names)
+    log_cotes, observes = matrice_duels(base)
+
+    combats = int(observes[np.ix_(ids_d1, ids_d2)].sum())
+    if combats == 0:
+        return 0, 0, 0
+
+    p_d1 = 1 / (1 + np.exp(-log_cotes[np.ix_(ids_d1, ids_d2)].mean()))
+    p_d1 = round(float(p_d1) * 100, 2)
+    return combats, p_d1, round(100 - p_d1, 2)
 
+
+# ================================================================
+# Mode modèle appris : score du modèle entraîné par modele_matchup.py
+# ================================================================
+_modele = {}
+
+
+def charger_modele(path=MODELE_FILE):
+    """Modèle sauvegardé (rechargé si le fichier change), None s'il n'existe pas."""
+    if not os.path.exists(path):
+        return None
+    cle = (path, os.path.getmtime(path))
+    if _modele.get("cle") != cle:
+        _modele.update(cle=cle, modele=ModeleMatchup.charger(path))
+    return _modele["modele"]
+
+
+def analyse_modele(deck1_names, deck2_names):
+    """Même retour qu'analyse_combat : (combats d'entraînement, % Deck 1, % Deck 2)."""
+    modele = charger_modele()
+    if modele is None:
+        return 0, 0, 0
+
+    p_d1 = round(modele.predire(deck1_names, deck2_names) * 100, 2)
+    return modele.nb_combats, p_d1, round(100 - p_d1, 2)
+
+
+def resultat_combat(combats_selectionnes, vic_d1, vic_d2):
     if combats_selectionnes == 0:
         return 0, 0, 0
 
@@ -65,6 +357,37 @@ def analyse_combat(deck1_names, deck2_names, precision):
 
     return combats_selectionnes, p_d1, p_d2
 
+
+# Version de référence : relit le CSV ligne par ligne à chaque appel,
+# découpé en morceaux parcourus par nb_processus processus (tous les
+# cœurs par défaut ; un seul pour un petit fichier)
+def analyse_combat_csv(deck1_names, deck2_names, precision, nb_processus=None):
+    with instrumentation.tracer("analyse_combat_csv", precision=precision):
+        combats_selectionnes, vic_d1, vic_d2, lignes = scan_parallele.parcourir(
+            DONNEES_COMBATS, scan_parallele.combats_morceau, (deck1_names, deck2_names, precision),
+            scan_parallele.sommer_combats, nb_processus)
+        instrumentation.compter("lignes_parcourues", lignes)
+
+    return resultat_combat(combats_selectionnes, vic_d1, vic_d2)
+
+# Analyse exécutée par le thread de travail de l'interface
+def analyser(tache, mode, deck1_names, deck2_names, precision):
+    """(libellé, combats, % Deck 1, % Deck 2) ; la progression suit le
+    chargement de la base (lignes ajoutées depuis le CSV), puis le parcours
+    des combats par l'analyse (lignes examinées)."""
+    if mode == MODE_MODELE:
+        return ("Combats d'entraînement du modèle",) + analyse_modele(deck1_names, deck2_names)
+
+    with instrumentation.chrono("chargement_base"):
+        base = charger_base(DONNEES_COMBATS, progression=tache.progression)
+    if tache.annulee():
+        return None
+    if mode == MODE_CARTES:
+        return ("Duels de cartes observés",) + analyse_par_cartes(deck1_names, deck2_names, base=base)
+    return ("Combats détectés (comptés double sens)",) + analyse_combat(deck1_names, deck2_names, precision, base=base,
+                                                                        progression=tache.progression)
+
+
 # ================================================================
 # Interface Tkinter Modernisée
 # ================================================================
@@ -80,6 +403,9 @@ class ClashApp:
         root.geometry("1000x750")
         root.configure(bg="#1e1e1e")
 
+        self.executeur = ExecuteurFond(root)
+        root.protocol("WM_DELETE_WINDOW", self.fermer)
+
         self.build_ui()
 
     # ----------------------------------------------------------
@@ -148,15 +474,26 @@ class ClashApp:
                                      values=list(range(1, 9)))
         precision_box.pack(side="left")
 
+        tk.Label(precision_frame, text="Mode :", fg="white", bg="#1e1e1e",
+                 font=("Arial", 13)).pack(side="left", padx=(20, 5))
+
+        self.mode_var = tk.StringVar(value=MODE_COMBATS)
+        mode_box = ttk.Combobox(precision_frame, textvariable=self.mode_var, width=20,
+                                values=MODES, state="readonly")
+        mode_box.pack(side="left")
+
         # RESULTATS
         result_frame = tk.LabelFrame(self.root, text="Résultats", bg="#1e1e1e", fg="white",
                                      font=("Arial", 12, "bold"), padx=10, pady=10)
         result_frame.pack(fill="x", padx=10, pady=10)
 
-        self.result_label = tk.Label(result_frame, text="Sélectionnez 8 cartes pour chaque deck...",
+        self.result_label = tk.Label(result_frame, text=INVITE_SELECTION,
                                      fg="white", bg="#1e1e1e", font=("Arial", 14))
         self.result_label.pack()
 
+        self.progress = ttk.Progressbar(result_frame, mode="determinate", maximum=100, length=400)
+        self.progress.pack(pady=(5, 0))
+
     # ----------------------------------------------------------
     def update_selection(self):
         # Limiter à 8 cartes
@@ -169,6 +506,11 @@ class ClashApp:
 
         if sum(v.get() for v in self.deck1_vars) == 8 and sum(v.get() for v in self.deck2_vars) == 8:
             self.run_ia()
+        else:
+            # analyse en cours abandonnée, ou résultat d'un deck qui a changé
+            self.executeur.annuler()
+            self.arreter_progression()
+            self.result_label.config(text=INVITE_SELECTION)
 
     def reset_excess(self, deck_vars):
         count = 0
@@ -180,19 +522,46 @@ class ClashApp:
 
     # ----------------------------------------------------------
     def run_ia(self):
+        # les widgets ne se lisent que depuis la boucle Tk
         precision = self.precision_var.get()
 
         deck1_names = [self.cards[i][1] for i, v in enumerate(self.deck1_vars) if v.get()]
         deck2_names = [self.cards[i][1] for i, v in enumerate(self.deck2_vars) if v.get()]
 
-        combats, p1, p2 = analyse_combat(deck1_names, deck2_names, precision)
-
+        self.result_label.config(text="Analyse en cours...")
+        self.progress.config(mode="indeterminate")
+        self.progress.start()
+        self.executeur.soumettre(analyser, self.mode_var.get(), deck1_names, deck2_names, precision,
+                                 quand_fini=self.afficher_resultat, quand_progres=self.afficher_progression,
+                                 quand_erreur=self.afficher_erreur)
+
+    def afficher_progression(self, lignes, fraction):
+        self.progress.stop()
+        self.progress.config(mode="determinate", value=fraction * 100)
+        self.result_label.config(text=f"Combats : {lignes} lignes traitées...")
+
+    def arreter_progression(self):
+        self.progress.stop()
+        self.progress.config(mode="determinate", value=0)
+
+    def afficher_resultat(self, resultat):
+        self.arreter_progression()
+        libelle, combats, p1, p2 = resultat
         self.result_label.config(
-            text=f"Combats détectés (comptés double sens) : {combats}\n"
+            text=f"{libelle} : {combats}\n"
                  f"Victoire Deck 1 : {p1}%\n"
                  f"Victoire Deck 2 : {p2}%"
         )
 
+    def afficher_erreur(self, erreur):
+        self.arreter_progression()
+        self.result_label.config(text="Analyse impossible.")
+        messagebox.showerror("Erreur", str(erreur))
+
+    def fermer(self):
+        self.executeur.fermer()
+        self.root.destroy()
+
 # ================================================================
 # Lancement
 # ================================================================
@@ -0,0 +1,275 @@
+# Instrumentation des chemins chauds (analyses, crawlers)
+# ------------------------------------------------------------
+# Chronomètres (gestionnaires de contexte), compteurs et histogrammes,
+# regroupés dans un registre par processus. Désactivée par défaut : les
+# fonctions retournent alors immédiatement (un test de booléen), et
+# chrono() renvoie un contexte vide partagé.
+#
+#   CR_INSTRUMENTATION=1        -> active les mesures
+#   CR_METRIQUES_PORT=9108      -> /metrics (texte Prometheus) et
+#                                  /metrics.json sur ce port local
+#   CR_METRIQUES_JSON=m.jsonl   -> une ligne JSON (instantané du registre)
+#                                  ajoutée à la sortie du programme
+#
+# Une trace regroupe les mesures d'une requête (analyse d'un duel de
+# decks) : durées des étapes et compteurs (lignes parcourues...). Les
+# dernières traces sont gardées pour le panneau de débogage Streamlit.
+# ------------------------------------------------------------
+
+import atexit
+import json
+import os
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+ACTIVE = os.environ.get("CR_INSTRUMENTATION", "") not in ("", "0")
+PREFIXE = "cr_"
+# bornes des histogrammes de durées, en secondes
+BORNES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+NB_TRACES = 100
+
+_NUL = nullcontext()
+
+
+class Registre:
+    """Compteurs et histogrammes par (nom, étiquettes), et dernières traces."""
+
+    def __init__(self, nb_traces=NB_TRACES):
+        self.verrou = threading.Lock()
+        self.compteurs = {}
+        self.histogrammes = {}  # cle -> [comptes par borne (+inf en dernier), somme, nombre]
+        self.traces = deque(maxlen=nb_traces)
+
+    def compter(self, cle, n):
+        with self.verrou:
+            self.compteurs[cle] = self.compteurs.get(cle, 0) + n
+
+    def observer(self, cle, valeur):
+        with self.verrou:
+            h = self.histogrammes.get(cle)
+            if h is None:
+                h = self.histogrammes[cle] = [[0] * (len(BORNES) + 1), 0.0, 0]
+            h[0][bisect_left(BORNES, valeur)] += 1
+            h[1] += valeur
+            h[2] += 1
+
+    def vider(self):
+        with self.verrou:
+            self.compteurs.clear()
+            self.histogrammes.clear()
+            self.traces.clear()
+
+
+_registre = Registre()
+_local = threading.local()  # trace en cours du thread
+
+
+def active():
+    return ACTIVE
+
+
+def activer(valeur=True):
+    """Active ou désactive les mesures (benchmarks, débogage interactif)."""
+    global ACTIVE
+    ACTIVE = valeur
+
+
+def _cle(nom, etiquettes):
+    return nom, tuple(sorted(etiquettes.items())) if etiquettes else ()
+
+
+# ================================================================
+# Mesures
+# ================================================================
+class _Chrono:
+    __slots__ = ("cle", "nom", "t0")
+
+    def __init__(self, nom, etiquettes):
+        self.nom = nom
+        self.cle = _cle(nom, etiquettes)
+
+    def __enter__(self):
+        self.t0 = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duree = perf_counter() - self.t0
+        _registre.observer(self.cle, duree)
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace["etapes_ms"][self.nom] = round(trace["etapes_ms"].get(self.nom, 0) + duree * 1000, 3)
+        return False
+
+
+def chrono(nom, **etiquettes):
+    """with chrono("http_requete", api="battlelog"): ... -> histogramme des durées."""
+    if not ACTIVE:
+        return _NUL
+    return _Chrono(nom, etiquettes)
+
+
+def compter(nom, n=1, **etiquettes):
+    if not ACTIVE:
+        return
+    _registre.compter(_cle(nom, etiquettes), n)
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace["compteurs"][nom] = trace["compteurs"].get(nom, 0) + n
+
+
+def observer(nom, valeur, **etiquettes):
+    """Valeur quelconque (durée mesurée ailleurs...) dans un histogramme."""
+    if ACTIVE:
+        _registre.observer(_cle(nom, etiquettes), valeur)
+
+
+class _Trace:
+    __slots__ = ("trace", "precedente", "t0")
+
+    def __init__(self, nom, details):
+        self.trace = {"nom": nom, "date": datetime.now().isoformat(timespec="seconds"),
+                      "details": details, "duree_ms": None, "etapes_ms": {}, "compteurs": {}}
+
+    def __enter__(self):
+        self.precedente = getattr(_local, "trace", None)
+        _local.trace = self.trace
+        self.t0 = perf_counter()
+        return self.trace
+
+    def __exit__(self, *exc):
+        duree = perf_counter() - self.t0
+        _local.trace = self.precedente
+        self.trace["duree_ms"] = round(duree * 1000, 3)
+        _registre.observer((self.trace["nom"], ()), duree)
+        with _registre.verrou:
+            _registre.traces.append(self.trace)
+        return False
+
+
+def tracer(nom, **details):
+    """Trace d'une requête : les chronos et compteurs du thread pendant le
+    bloc sont aussi rattachés à la trace. Une trace imbriquée dans une
+    autre n'est pas créée (la requête englobante garde tout)."""
+    if not ACTIVE or getattr(_local, "trace", None) is not None:
+        return _NUL
+    return _Trace(nom, details)
+
+
+def dernieres_traces(n=None):
+    """Traces les plus récentes d'abord."""
+    with _registre.verrou:
+        traces = list(_registre.traces)
+    return traces[::-1][:n]
+
+
+def vider():
+    _registre.vider()
+
+
+# ================================================================
+# Export
+# ================================================================
+def _etiquettes_texte(etiquettes):
+    if not etiquettes:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in etiquettes) + "}"
+
+
+def exporter_prometheus():
+    """Format texte d'exposition Prometheus."""
+    with _registre.verrou:
+        compteurs = dict(_registre.compteurs)
+        histogrammes = {cle: (list(h[0]), h[1], h[2]) for cle, h in _registre.histogrammes.items()}
+
+    lignes = []
+    for nom in sorted({nom for nom, _ in compteurs}):
+        lignes.append(f"# TYPE {PREFIXE}{nom}_total counter")
+        for (n, etiquettes), valeur in sorted(compteurs.items()):
+            if n == nom:
+                lignes.append(f"{PREFIXE}{nom}_total{_etiquettes_texte(etiquettes)} {valeur}")
+    for nom in sorted({nom for nom, _ in histogrammes}):
+        lignes.append(f"# TYPE {PREFIXE}{nom}_secondes histogram")
+        for (n, etiquettes), (comptes, somme, nombre) in sorted(histogrammes.items()):
+            if n != nom:
+                continue
+            cumul = 0
+            for borne, compte in zip(BORNES + ("+Inf",), comptes):
+                cumul += compte
+                lignes.append(f"{PREFIXE}{nom}_secondes_bucket"
+                              f"{_etiquettes_texte(etiquettes + (('le', borne),))} {cumul}")
+            lignes.append(f"{PREFIXE}{nom}_secondes_sum{_etiquettes_texte(etiquettes)} {somme:.6f}")
+            lignes.append(f"{PREFIXE}{nom}_secondes_count{_etiquettes_texte(etiquettes)} {nombre}")
+    return "\n".join(lignes) + "\n"
+
+
+def exporter_json():
+    """Instantané du registre : compteurs, résumé des histogrammes, traces."""
+    def nom_complet(nom, etiquettes):
+        return nom + _etiquettes_texte(etiquettes)
+
+    with _registre.verrou:
+        compteurs = {nom_complet(*cle): v for cle, v in _registre.compteurs.items()}
+        histogrammes = {nom_complet(*cle): {"nombre": h[2], "somme_s": round(h[1], 6),
+                                            "moyenne_ms": round(h[1] / h[2] * 1000, 3),
+                                            "comptes": dict(zip(map(str, BORNES + ("+Inf",)), h[0]))}
+                        for cle, h in _registre.histogrammes.items()}
+        traces = list(_registre.traces)
+    return {"date": datetime.now().isoformat(timespec="seconds"), "pid": os.getpid(),
+            "compteurs": compteurs, "histogrammes": histogrammes, "traces": traces}
+
+
+def ecrire_json(path):
+    """Ajoute un instantané du registre (une ligne JSON) au fichier."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(exporter_json(), ensure_ascii=False) + "\n")
+
+
+class _Metriques(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            corps, type_contenu = exporter_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            corps, type_contenu = json.dumps(exporter_json(), ensure_ascii=False), "application/json"
+        else:
+            self.send_error(404)
+            return
+        corps = corps.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", type_contenu)
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def log_message(self, *args):
+        pass
+
+
+_export = {}
+
+
+def servir(port, hote="127.0.0.1"):
+    """Point d'accès local /metrics dans un thread (démon)."""
+    serveur = ThreadingHTTPServer((hote, port), _Metriques)
+    threading.Thread(target=serveur.serve_forever, daemon=True).start()
+    return serveur
+
+
+def demarrer_export():
+    """Démarre les exports demandés par l'environnement (une seule fois
+    par processus). Sans effet si l'instrumentation est désactivée."""
+    if not ACTIVE or _export:
+        return
+    port = os.environ.get("CR_METRIQUES_PORT")
+    if port:
+        _export["serveur"] = servir(int(port))
+    path = os.environ.get("CR_METRIQUES_JSON")
+    if path:
+        _export["json"] = path
+        atexit.register(ecrire_json, path)
+    _export["demarre"] = True
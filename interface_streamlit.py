@@ -1,13 +1,18 @@
 import streamlit as st
 import csv
-import ast
 import os
 import sys
 
 # importation logique
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 try:
-    from ia_predictive import analyse_combat
+    from ia_predictive import (MODE_CARTES, MODE_COMBATS, MODE_MODELE, MODES,
+                               analyse_combat_toutes_precisions, analyse_modele, analyse_par_cartes,
+                               precision_recommandee)
+    from base_combats import DONNEES_COMBATS, charger_base, synchroniser_base
+    from requete_progressive import RequeteProgressive
+    from cache_images import CACHE_DIR, INDEX_FILE, chemins_locaux, data_uri, lire_urls
+    import instrumentation
 except ImportError:
     st.error("Erreur : Le fichier 'ia_predictive.py' est introuvable.")
     st.stop()
@@ -19,6 +24,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# mesures (CR_INSTRUMENTATION=1) : export /metrics ou JSON si demandé
+instrumentation.demarrer_export()
+
 # initialisation des variables de session (pour mémoriser les decks)
 if "deck1" not in st.session_state:
     st.session_state.deck1 = []
@@ -37,26 +45,21 @@ def toggle_selection(deck_key, card_name):
         else:
             st.toast("Le deck est déjà plein (8 cartes max) !", icon="⚠️")
 
+    # aperçu du deck partiel : seule la carte cliquée est ajoutée / retirée
+    requete = st.session_state.get(f"requete_{deck_key}")
+    if requete is not None:
+        requete.definir(current_list)
+
 
 # chargement des données
 @st.cache_data
-def load_card_data():
-    path_images = "dataset/clashroyale_cards.csv"
+def load_card_data(version_cache):
+    # version_cache : date de l'index du cache d'images, pour relire après un préchargement
     path_names = "dataset/cartes.csv"
 
-    # charger le mapping Nom -> Image URL
-    image_map = {}
-    if os.path.exists(path_images):
-        with open(path_images, mode='r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    raw_urls = row.get('iconUrls', "{}")
-                    urls = ast.literal_eval(raw_urls)
-                    if 'medium' in urls:
-                        image_map[row.get('name')] = urls['medium']
-                except:
-                    continue
+    # nom -> URL distante et nom -> vignette locale (python cache_images.py)
+    image_map = lire_urls()
+    local_map = chemins_locaux()
 
     # charger la liste officielle
     official_cards = []
@@ -67,15 +70,67 @@ def load_card_data():
             for row in reader:
                 if row:
                     name = row[1]
-                    url = image_map.get(name, None)
-                    official_cards.append({"name": name, "image_url": url})
+                    local = local_map.get(name)
+                    official_cards.append({
+                        "name": name,
+                        "image_url": image_map.get(name, None),
+                        "image_local": local,
+                        # vignette incluse dans la page : la grille du sélecteur
+                        # ne déclenche aucune requête d'image
+                        "image_inline": data_uri(local) if local else None,
+                    })
 
     return official_cards
 
 
+# base de combats : une seule instance par processus, partagée par toutes
+# les sessions. cache_resource ne copie pas l'objet (contrairement à
+# cache_data qui le sérialise) et les colonnes sont des memmap en lecture
+# seule, donc la mémoire ne grandit pas avec le nombre d'utilisateurs.
+@st.cache_resource(max_entries=1, show_spinner="Ouverture de la base de combats...")
+def load_battle_base(signature):
+    return charger_base(DONNEES_COMBATS)
+
+
+def battle_base():
+    # la signature change quand le crawler a ajouté des combats
+    return load_battle_base(synchroniser_base(DONNEES_COMBATS))
+
+
+def requete_deck(deck_key):
+    """Requête progressive de la session pour ce deck (recréée si la base a changé)."""
+    base = battle_base()
+    requete = st.session_state.get(f"requete_{deck_key}")
+    if requete is None or requete.base is not base:
+        requete = RequeteProgressive(base)
+        st.session_state[f"requete_{deck_key}"] = requete
+    requete.definir(st.session_state[deck_key])
+    return requete
+
+
+def afficher_apercu(deck_key):
+    # deck en construction : taux de victoire et contre-cartes provisoires
+    try:
+        requete = requete_deck(deck_key)
+    except FileNotFoundError:
+        requete = None
+    # pas encore de combats récupérés (pas de fichier, ou en-tête seul)
+    if requete is None or len(requete.base) == 0:
+        st.caption("Aperçu indisponible : aucun combat récupéré pour l'instant.")
+        return
+    combats, victoire = requete.resultat()
+    if combats == 0:
+        st.caption("Aperçu : aucun combat avec ces cartes.")
+        return
+    st.caption(f"Aperçu ({len(st.session_state[deck_key])}/8) : {victoire}% de victoires sur {combats} combats")
+    st.caption("Cartes qui battent ce début de deck : " + ", ".join(requete.contre_cartes(8)))
+
+
 # chargement
-cards_data = load_card_data()
-name_to_url = {c["name"]: c["image_url"] for c in cards_data}
+index_images = os.path.join(CACHE_DIR, INDEX_FILE)
+cards_data = load_card_data(os.path.getmtime(index_images) if os.path.exists(index_images) else 0)
+# vignette locale si elle est en cache, sinon l'icône distante
+name_to_url = {c["name"]: c["image_local"] or c["image_url"] for c in cards_data}
 
 
 # fonction modale
@@ -100,7 +155,10 @@ def open_deck_selector(deck_key):
 
         with cols[i % 4]:
             # Affichage de l'image
-            if c_url:
+            if card["image_inline"]:
+                st.markdown(f'<img src="{card["image_inline"]}" alt="{c_name}" style="width:100%">',
+                            unsafe_allow_html=True)
+            elif c_url:
                 st.image(c_url, use_container_width=True)
             else:
                 st.write(c_name)
@@ -130,8 +188,22 @@ def open_deck_selector(deck_key):
 
 st.title("⚔️ Clash Royale - Analyseur de Deck IA")
 
+# mode de prédiction : combats similaires (précis), duels de cartes ou modèle appris (instantanés)
+mode = st.radio("Mode de prédiction", MODES, horizontal=True)
+
 # curseur précision analyse
-precision = st.slider("Précision de l'analyse", 1, 8, 5)
+precision_auto = st.toggle("Précision automatique (la plus haute avec assez de combats)", value=True)
+precision = st.slider("Précision de l'analyse", 1, 8, 5, disabled=precision_auto)
+
+# tranche de trophées (combats similaires) : les deux joueurs dans la plage
+TROPHEES_MAX = 10000
+trophees = st.slider("Trophées des joueurs", 0, TROPHEES_MAX, (0, TROPHEES_MAX), step=100,
+                     disabled=mode != MODE_COMBATS)
+limiter_ecart = st.toggle("Limiter l'écart de trophées entre les joueurs", value=False,
+                          disabled=mode != MODE_COMBATS)
+ecart_max = st.slider("Écart maximal", 0, 2000, 300, step=50) if limiter_ecart else None
+if trophees == (0, TROPHEES_MAX):
+    trophees = None
 
 st.markdown("---")
 
@@ -158,6 +230,8 @@ with col1:
                     st.image(img, caption=card_name, use_container_width=True)
                 else:
                     st.info(card_name)
+        if len(current_deck1) < 8:
+            afficher_apercu("deck1")
     else:
         st.info("Aucune carte sélectionnée.")
 
@@ -182,6 +256,8 @@ with col2:
                     st.image(img, caption=card_name, use_container_width=True)
                 else:
                     st.info(card_name)
+        if len(current_deck2) < 8:
+            afficher_apercu("deck2")
     else:
         st.info("Aucune carte sélectionnée.")
 
@@ -202,14 +278,27 @@ if analyze_btn:
     if len(d1) != 8 or len(d2) != 8:
         st.warning(f"⚠️ Les decks doivent être complets (8 cartes).\nDeck 1: {len(d1)}/8 | Deck 2: {len(d2)}/8")
     else:
-        with st.spinner("Analyse des matchs historiques en cours..."):
-            combats, p1, p2 = analyse_combat(d1, d2, precision)
+        resultats = None
+        if mode == MODE_CARTES:
+            combats, p1, p2 = analyse_par_cartes(d1, d2, base=battle_base())
+        elif mode == MODE_MODELE:
+            combats, p1, p2 = analyse_modele(d1, d2)
+        else:
+            with st.spinner("Analyse des matchs historiques en cours..."):
+                resultats = analyse_combat_toutes_precisions(d1, d2, base=battle_base(),
+                                                             trophees=trophees, ecart_max=ecart_max)
+
+            if precision_auto:
+                # à défaut d'échantillon suffisant, la précision 1 (la plus large)
+                precision = precision_recommandee(resultats) or 1
+            _, combats, p1, p2 = resultats[precision - 1]
 
-        st.success("Analyse terminée !")
+        st.success("Analyse terminée ! " + (f"({mode.lower()})" if resultats is None else f"(précision {precision})"))
 
         # Affichage résultats
         r1, r2, r3 = st.columns(3)
-        r1.metric("Combats analysés", combats, border=True)
+        libelles = {MODE_CARTES: "Duels de cartes observés", MODE_MODELE: "Combats d'entraînement"}
+        r1.metric(libelles.get(mode, "Combats analysés"), combats, border=True)
         r2.metric("Victoire Deck 1", f"{p1}%", border=True)
         r3.metric("Victoire Deck 2", f"{p2}%", border=True)
 
@@ -221,5 +310,44 @@ if analyze_btn:
                 st.markdown(f"### 🏆 Le **Deck 2** l'emporte statistiquement !")
             else:
                 st.markdown("### 🤝 Égalité parfaite.")
+        elif mode == MODE_MODELE:
+            st.warning("Aucun modèle entraîné : lancer `python modele_matchup.py`.")
+        else:
+            st.warning("Aucun combat similaire trouvé, même à la précision la plus basse.")
+
+        # tableau de toutes les précisions (calculées dans la même passe)
+        if resultats:
+            with st.expander("Résultats pour toutes les précisions"):
+                st.dataframe(
+                    [{"Précision": p, "Combats": c, "Victoire Deck 1 (%)": v1, "Victoire Deck 2 (%)": v2}
+                     for p, c, v1, v2 in resultats],
+                    hide_index=True,
+                    use_container_width=True
+                )
+
+
+# panneau de débogage : durées par requête et lignes parcourues
+if instrumentation.active():
+    with st.expander("🔧 Débogage : mesures des dernières requêtes"):
+        traces = instrumentation.dernieres_traces(20)
+        if traces:
+            st.dataframe(
+                [{"Heure": t["date"][11:], "Requête": t["nom"], "Durée (ms)": t["duree_ms"],
+                  "Lignes parcourues": t["compteurs"].get("lignes_parcourues", 0),
+                  "Étapes (ms)": ", ".join(f"{e} {d}" for e, d in t["etapes_ms"].items()),
+                  "Détails": ", ".join(f"{k}={v}" for k, v in t["details"].items() if v is not None)}
+                 for t in traces],
+                hide_index=True,
+                use_container_width=True
+            )
         else:
-            st.warning("Aucun combat similaire trouvé. Essayez de réduire la précision.")
\ No newline at end of file
+            st.caption("Aucune requête mesurée pour l'instant.")
+
+        st.dataframe(
+            [{"Mesure": nom, "Nombre": h["nombre"], "Moyenne (ms)": h["moyenne_ms"]}
+             for nom, h in sorted(instrumentation.exporter_json()["histogrammes"].items())],
+            hide_index=True,
+            use_container_width=True
+        )
+        st.download_button("Exporter (texte Prometheus)", instrumentation.exporter_prometheus(),
+                           file_name="metriques.txt")
@@ -0,0 +1,184 @@
+# Modèle appris de matchup deck contre deck
+# ------------------------------------------------------------
+# Régression logistique + machine de factorisation, entraînée hors ligne
+# sur la base de combats et sauvegardée dans un petit fichier .npz.
+#
+# Pour deux decks codés en vecteurs 0/1 par carte (v1, v2) :
+#   score = w . (v1 - v2) + b * (trophées1 - trophées2) / 1000
+#         + v1' (U V' - V U') v2
+#   P(deck 1 gagne) = sigmoid(score)
+# Les 242 entrées (v1, v2) sont prises sous forme antisymétrique, si bien
+# que P(d2 bat d1) = 1 - P(d1 bat d2). Le terme de factorisation (rang k)
+# capture les interactions carte contre carte.
+#
+# Le score d'un lot de paires n'est que des produits de matrices :
+# des milliers de paires par appel (predire_lot), sans parcourir la base.
+#
+#   python modele_matchup.py [epoques]     -> entraîne et sauvegarde
+# ------------------------------------------------------------
+
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from base_combats import DONNEES_COMBATS, charger_base
+
+MODELE_FILE = "dataset/modele_matchup.npz"
+
+RANG = 8
+EPOQUES = 5
+TAILLE_LOT = 4096
+PAS = 0.01           # Adam
+REGULARISATION = 1e-5
+PART_VALIDATION = 0.1
+
+
+def encoder_decks(ids, nb_ids):
+    """Matrice (M, nb_ids) 0/1 à partir d'une matrice (M, 8) d'ids."""
+    ids = np.asarray(ids)
+    x = np.zeros((len(ids), nb_ids), dtype=np.float32)
+    np.put_along_axis(x, ids.astype(np.int64), 1.0, axis=1)
+    x[:, 0] = 0  # carte inconnue
+    return x
+
+
+def _sigmoide(s):
+    return 1 / (1 + np.exp(-s))
+
+
+class ModeleMatchup:
+    """Poids du modèle et prédiction vectorisée."""
+
+    def __init__(self, w, b, u, v, cartes, nb_combats=0):
+        # cartes[id] = nom (comme BaseCombats.noms_cartes)
+        self.w = w
+        self.b = b
+        self.u = u
+        self.v = v
+        self.cartes = cartes
+        self.nb_combats = nb_combats
+        self.ids_cartes = {nom: i for i, nom in enumerate(cartes) if nom}
+
+    @staticmethod
+    def initial(nb_ids, cartes, rang=RANG, graine=0):
+        rng = np.random.default_rng(graine)
+        return ModeleMatchup(np.zeros(nb_ids, dtype=np.float32), np.float32(0),
+                             (0.01 * rng.standard_normal((nb_ids, rang))).astype(np.float32),
+                             (0.01 * rng.standard_normal((nb_ids, rang))).astype(np.float32),
+                             cartes)
+
+    def scores(self, x1, x2, ecart_trophees=None):
+        """Scores (log-cotes) de x1 contre x2, matrices one-hot (M, nb_ids)."""
+        s = (x1 - x2) @ self.w
+        s += ((x1 @ self.u) * (x2 @ self.v)).sum(axis=1) - ((x1 @ self.v) * (x2 @ self.u)).sum(axis=1)
+        if ecart_trophees is not None:
+            s += self.b * np.asarray(ecart_trophees, dtype=np.float32) / 1000
+        return s
+
+    def ids(self, deck):
+        return [self.ids_cartes[n] for n in set(deck) if n in self.ids_cartes]
+
+    def predire_lot(self, decks1, decks2, ecart_trophees=None):
+        """Probabilités que decks1[i] batte decks2[i] (listes de noms de cartes)."""
+        nb_ids = len(self.w)
+        x1 = np.zeros((len(decks1), nb_ids), dtype=np.float32)
+        x2 = np.zeros((len(decks2), nb_ids), dtype=np.float32)
+        for i, (d1, d2) in enumerate(zip(decks1, decks2)):
+            x1[i, self.ids(d1)] = 1
+            x2[i, self.ids(d2)] = 1
+        return _sigmoide(self.scores(x1, x2, ecart_trophees))
+
+    def predire(self, deck1, deck2):
+        return float(self.predire_lot([deck1], [deck2])[0])
+
+    def sauvegarder(self, path=MODELE_FILE):
+        np.savez(path, w=self.w, b=self.b, u=self.u, v=self.v,
+                 cartes=np.array(self.cartes), nb_combats=self.nb_combats)
+
+    @staticmethod
+    def charger(path=MODELE_FILE):
+        with np.load(path) as data:
+            return ModeleMatchup(data["w"], data["b"], data["u"], data["v"],
+                                 [str(c) for c in data["cartes"]], int(data["nb_combats"]))
+
+
+# ================================================================
+# Entraînement
+# ================================================================
+def _gradients(modele, xg, xp, t):
+    """Gradients de la log-vraisemblance négative moyenne (le gagnant est
+    toujours en position 1, le modèle étant antisymétrique)."""
+    a, bv, c, e = xg @ modele.u, xp @ modele.v, xg @ modele.v, xp @ modele.u
+    s = (xg - xp) @ modele.w + modele.b * t + (a * bv).sum(axis=1) - (c * e).sum(axis=1)
+    g = -_sigmoide(-s) / len(s)  # d perte / d score
+
+    gw = (xg - xp).T @ g
+    gb = np.float32(t @ g)
+    gu = xg.T @ (g[:, None] * bv) - xp.T @ (g[:, None] * c)
+    gv = xp.T @ (g[:, None] * a) - xg.T @ (g[:, None] * e)
+    return gw, gb, gu, gv
+
+
+def perte(modele, base, lignes):
+    """Log-perte et précision (part de gagnants prédits) sur des lignes."""
+    nb_ids = len(modele.w)
+    pertes, bons = 0.0, 0
+    for debut in range(0, len(lignes), TAILLE_LOT):
+        lot = lignes[debut:debut + TAILLE_LOT]
+        t = (np.asarray(base.trophees_g[lot]) - np.asarray(base.trophees_p[lot])).astype(np.float32) / 1000
+        s = modele.scores(encoder_decks(base.ids_g[lot], nb_ids), encoder_decks(base.ids_p[lot], nb_ids)) + modele.b * t
+        pertes += float(np.logaddexp(0, -s).sum())
+        bons += int((s > 0).sum())
+    return pertes / max(len(lignes), 1), bons / max(len(lignes), 1)
+
+
+def entrainer(base, epoques=EPOQUES, rang=RANG, graine=0, afficher=print):
+    """Entraîne un ModeleMatchup sur la base (Adam par mini-lots)."""
+    rng = np.random.default_rng(graine)
+    nb_ids = len(base.noms_cartes)
+    modele = ModeleMatchup.initial(nb_ids, base.noms_cartes, rang, graine)
+
+    lignes = rng.permutation(len(base))
+    nb_validation = int(len(lignes) * PART_VALIDATION)
+    validation, apprentissage = lignes[:nb_validation], lignes[nb_validation:]
+    modele.nb_combats = len(apprentissage)
+
+    params = ["w", "b", "u", "v"]
+    m = {p: np.zeros_like(getattr(modele, p)) for p in params}
+    v2 = {p: np.zeros_like(getattr(modele, p)) for p in params}
+    etape = 0
+
+    for epoque in range(epoques):
+        t0 = perf_counter()
+        rng.shuffle(apprentissage)
+        for debut in range(0, len(apprentissage), TAILLE_LOT):
+            lot = np.sort(apprentissage[debut:debut + TAILLE_LOT])
+            xg = encoder_decks(base.ids_g[lot], nb_ids)
+            xp = encoder_decks(base.ids_p[lot], nb_ids)
+            t = (np.asarray(base.trophees_g[lot]) - np.asarray(base.trophees_p[lot])).astype(np.float32) / 1000
+
+            etape += 1
+            for p, grad in zip(params, _gradients(modele, xg, xp, t)):
+                valeur = getattr(modele, p)
+                grad = grad + REGULARISATION * valeur
+                m[p] = 0.9 * m[p] + 0.1 * grad
+                v2[p] = 0.999 * v2[p] + 0.001 * grad * grad
+                pas = PAS * np.sqrt(1 - 0.999 ** etape) / (1 - 0.9 ** etape)
+                setattr(modele, p, (valeur - pas * m[p] / (np.sqrt(v2[p]) + 1e-8)).astype(np.float32))
+
+        if nb_validation:
+            log_perte, precision = perte(modele, base, validation)
+            afficher(f"Époque {epoque + 1}/{epoques} ({perf_counter() - t0:.1f}s) : "
+                     f"log-perte validation {log_perte:.4f}, gagnant prédit {precision * 100:.1f}%")
+    return modele
+
+
+if __name__ == "__main__":
+    epoques = int(sys.argv[1]) if len(sys.argv) > 1 else EPOQUES
+    base = charger_base(DONNEES_COMBATS)
+    print(f"Entraînement sur {len(base)} combats...")
+    modele = entrainer(base, epoques)
+    modele.sauvegarder(MODELE_FILE)
+    print(f"Modèle sauvegardé dans {MODELE_FILE} ({os.path.getsize(MODELE_FILE) / 1e3:.0f} Ko)")
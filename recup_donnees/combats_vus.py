@@ -0,0 +1,78 @@
+import hashlib
+import os
+
+import numpy as np
+
+# ----------------------------------------------------------
+# Index des combats déjà enregistrés
+# ----------------------------------------------------------
+# Un combat entre deux joueurs explorés apparaît dans les deux battlelogs,
+# et une nouvelle exploration renvoie les mêmes combats : chaque combat
+# reçoit une clé stable (hash 64 bits des deux tags triés + battleTime)
+# vérifiée avant écriture dans combats_joueurs.csv.
+#
+# Sur disque : un fichier de clés uint64 triées (recherche par dichotomie)
+# et un journal des clés ajoutées depuis, fusionné par compacter().
+# ----------------------------------------------------------
+
+VUS_FILE = "../dataset/combats_vus.u64"
+
+
+def cle_combat(battle):
+    """Clé 64 bits du combat, identique vue de chacun des deux joueurs
+    (None si le battleTime ou un tag manque)."""
+    team = battle.get("team", [{}])[0]
+    opp = battle.get("opponent", [{}])[0]
+    moment = battle.get("battleTime")
+    if not moment or not team.get("tag") or not opp.get("tag"):
+        return None
+
+    texte = "|".join(sorted([team["tag"], opp["tag"]]) + [moment])
+    return int.from_bytes(hashlib.blake2b(texte.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class CombatsVus:
+    """Ensemble persistant des clés de combats déjà écrits."""
+
+    def __init__(self, path=VUS_FILE):
+        self.path = path
+        self.journal = path + ".journal"
+        self.triees = np.fromfile(path, dtype=np.uint64) if os.path.exists(path) else np.empty(0, np.uint64)
+        self.nouvelles = set()
+        if os.path.exists(self.journal):
+            self.nouvelles.update(np.fromfile(self.journal, dtype=np.uint64).tolist())
+        self.en_attente = []
+
+    def __len__(self):
+        return len(self.triees) + len(self.nouvelles)
+
+    def __contains__(self, cle):
+        if cle in self.nouvelles:
+            return True
+        i = np.searchsorted(self.triees, np.uint64(cle))
+        return i < len(self.triees) and int(self.triees[i]) == cle
+
+    def ajouter(self, cle):
+        self.nouvelles.add(cle)
+        self.en_attente.append(cle)
+
+    def enregistrer(self):
+        """Ajoute au journal les clés en attente (à appeler après avoir
+        vidé le CSV, pour ne jamais marquer vu un combat non écrit)."""
+        if not self.en_attente:
+            return
+        with open(self.journal, "ab") as f:
+            f.write(np.array(self.en_attente, dtype=np.uint64).tobytes())
+        self.en_attente = []
+
+    def compacter(self):
+        """Fusionne le journal dans le fichier trié."""
+        self.enregistrer()
+        if not self.nouvelles:
+            return
+        self.triees = np.union1d(self.triees, np.fromiter(self.nouvelles, dtype=np.uint64))
+        tmp = self.path + ".tmp"
+        self.triees.tofile(tmp)
+        os.replace(tmp, self.path)
+        os.remove(self.journal)
+        self.nouvelles = set()
@@ -1,9 +1,16 @@
 import requests
+import argparse
 import csv
-import itertools
 import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from time import time
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentation
+
 def load_api_key(path="cle_api.txt"):
     try:
         with open(path, "r", encoding="utf-8") as f:
@@ -13,117 +20,217 @@ def load_api_key(path="cle_api.txt"):
         exit()
 
 API_KEY = load_api_key()
-BASE_URL = "https://api.clashroyale.com/v1"
+BASE_URL = os.environ.get("CR_API_URL", "https://api.clashroyale.com/v1")
 
 OUTPUT_FILE = "../dataset/clans_trouves.csv"
 PROGRESS_FILE = "../progression/progress.txt"
 
 ALPHABET = "0289PYLQGRJCUV"
+BASE = len(ALPHABET)  # les tags sont des nombres en base 14
+LONGUEUR_MAX = 9
+
+NB_WORKERS = int(os.environ.get("NB_WORKERS", 16))  # requêtes en vol : 4 x NB_WORKERS
+TAILLE_LOT_CSV = 500           # lignes écrites (et progression sauvée) par lot
+INTERVALLE_AFFICHAGE = 2.0     # secondes entre deux affichages du débit
+
+# Une session par thread (requests.Session n'est pas garanti thread-safe)
+_local = threading.local()
 
-session = requests.Session()
-session.headers.update({
-    "Accept": "application/json",
-    "Authorization": f"Bearer {API_KEY}"
-})
 
-PROGRESS_SAVE_INTERVAL = 200
+def get_session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+        session.headers.update({
+            "Accept": "application/json",
+            "Authorization": f"Bearer {API_KEY}"
+        })
+    return session
 
 
 def check_clan_exists(tag):
     """Retourne True si le clan existe et a des membres."""
     url = f"{BASE_URL}/clans/{tag.replace('#', '%23')}"
     try:
-        r = session.get(url, timeout=1.5)
+        with instrumentation.chrono("http_requete", api="clans"):
+            r = get_session().get(url, timeout=1.5)
+        instrumentation.compter("http_reponses", api="clans", statut=r.status_code)
         if r.status_code != 200:
             return False
         return len(r.json().get("memberList", [])) > 0
-    except:
+    except Exception as e:
+        instrumentation.compter("http_erreurs", api="clans", erreur=type(e).__name__)
         return False
 
 
-def load_progress():
-    """Charge progression : (dernier_tag, longueur_en_cours)."""
-    if not os.path.exists(PROGRESS_FILE):
-        return None, 1
+def load_progress(path=PROGRESS_FILE):
+    """Charge progression : (prochain_index, longueur_en_cours).
+
+    Accepte aussi l'ancien format « dernier_tag;longueur »."""
+    if not os.path.exists(path):
+        return 0, 1
     try:
-        with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             content = f.read().strip()
         if not content:
-            return None, 1
-        tag, length = content.split(";")
-        return (tag if tag != "None" else None), int(length)
+            return 0, 1
+        valeur, length = content.split(";")
+        if valeur == "None":
+            return 0, int(length)
+        if valeur.startswith("#"):
+            return index_depuis_tag(valeur) + 1, int(length)
+        return int(valeur), int(length)
     except:
-        return None, 1
+        return 0, 1
 
 
-def save_progress(tag, length):
-    """Sauvegarde progression actuelle."""
-    with open(PROGRESS_FILE, "w", encoding="utf-8") as f:
-        f.write(f"{tag};{length}")
+def save_progress(prochain_index, length, path=PROGRESS_FILE):
+    """Sauvegarde progression actuelle (index du prochain tag à tester)."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"{prochain_index};{length}")
 
 
-def generate_tags(tag_length, start_from=None):
-    """Génère les tags pour une longueur donnée."""
-    started = start_from is None
+def tag_depuis_index(index, tag_length):
+    """Tag numéro index (en base 14) parmi les tags de longueur tag_length,
+    dans l'ordre de itertools.product(ALPHABET, repeat=tag_length)."""
+    chiffres = []
+    for _ in range(tag_length):
+        index, r = divmod(index, BASE)
+        chiffres.append(ALPHABET[r])
+    return "#" + "".join(reversed(chiffres))
 
-    for combo in itertools.product(ALPHABET, repeat=tag_length):
-        tag = "#" + "".join(combo)
-        if not started:
-            if tag == start_from:
-                started = True
-            continue
-        yield tag
 
+def index_depuis_tag(tag):
+    """Inverse de tag_depuis_index."""
+    index = 0
+    for c in tag.lstrip("#"):
+        index = index * BASE + ALPHABET.index(c)
+    return index
 
-def ensure_csv():
-    """Crée le fichier CSV s'il n'existe pas."""
-    if not os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["ClanTag", "Statut"])  # NOUVEL EN-TÊTE
 
+def plage_shard(tag_length, shard, nb_shards):
+    """Plage d'index [début, fin) attribuée au shard parmi nb_shards."""
+    total = BASE ** tag_length
+    return total * shard // nb_shards, total * (shard + 1) // nb_shards
 
-def main():
-
-    ensure_csv()
 
-    last_tag, last_length = load_progress()
-    print(f"➡️ Reprise : last_tag={last_tag}, longueur={last_length}")
+def generate_tags(tag_length, debut=0, fin=None):
+    """Génère les couples (index, tag) de debut (inclus) à fin (exclu) :
+    une reprise commence directement à l'index sauvegardé."""
+    if fin is None:
+        fin = BASE ** tag_length
+    for index in range(debut, fin):
+        yield index, tag_depuis_index(index, tag_length)
 
-    csv_file = open(OUTPUT_FILE, "a", newline="", encoding="utf-8")
-    writer = csv.writer(csv_file)
 
-    t0 = time()
-    global_counter = 0
-
-    for length in range(last_length, 10):
-        print(f"\n📏 Longueur de tag = {length}")
-
-        start_from = last_tag if length == last_length else None
-        last_tag = None
-
-        for tag in generate_tags(length, start_from=start_from):
-
-            global_counter += 1
+def ensure_csv(path=OUTPUT_FILE):
+    """Crée le fichier CSV s'il n'existe pas."""
+    if not os.path.exists(path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ClanTag", "Statut"])  # NOUVEL EN-TÊTE
 
-            if global_counter % 200 == 0:
-                print(f"Test {tag}")
 
-            if global_counter % PROGRESS_SAVE_INTERVAL == 0:
-                save_progress(tag, length)
+class EcrivainOrdonne:
+    """Écrit les résultats dans l'ordre des tags, par lots. La progression
+    sauvegardée est l'index suivant le dernier tag écrit : tous les tags
+    qui le précèdent sont dans le CSV, quel que soit l'ordre de fin des
+    requêtes."""
+
+    def __init__(self, csv_file, progress_file):
+        self.csv_file = csv_file
+        self.progress_file = progress_file
+        self.writer = csv.writer(csv_file)
+        self.lot = []
+        self.prochain_index = 0
+        self.nb_testes = 0
+        self.t0 = time()
+        self.dernier_affichage = self.t0
+
+    def ajouter(self, index, tag, is_valid, length):
+        self.lot.append([tag, "valide" if is_valid else "non valide"])
+        self.prochain_index = index + 1
+        self.nb_testes += 1
+
+        if is_valid:
+            print(f"\n✅ Clan valide trouvé : {tag}")
+
+        if len(self.lot) >= TAILLE_LOT_CSV:
+            self.vider(length)
+
+        maintenant = time()
+        if maintenant - self.dernier_affichage >= INTERVALLE_AFFICHAGE:
+            debit = self.nb_testes / (maintenant - self.t0)
+            print(f"\r⏱ {self.nb_testes} tags testés, {debit:.1f} tags/s, dernier : {tag}  ",
+                  end="", flush=True)
+            self.dernier_affichage = maintenant
+
+    def vider(self, length):
+        if not self.lot:
+            return
+        with instrumentation.chrono("ecriture_csv"):
+            self.writer.writerows(self.lot)
+            self.csv_file.flush()
+            save_progress(self.prochain_index, length, self.progress_file)
+        instrumentation.compter("tags_ecrits", len(self.lot))
+        self.lot = []
+
+
+def fichier_shard(path, shard, nb_shards):
+    """../progression/progress.txt -> ../progression/progress_shard2sur4.txt"""
+    if nb_shards == 1:
+        return path
+    racine, ext = os.path.splitext(path)
+    return f"{racine}_shard{shard}sur{nb_shards}{ext}"
 
-            # Vérification du clan
-            is_valid = check_clan_exists(tag)
 
-            # Écriture CSV obligatoire
-            writer.writerow([tag, "valide" if is_valid else "non valide"])
-            csv_file.flush()
+def main():
+    parser = argparse.ArgumentParser(description="Recherche de clans par force brute sur les tags")
+    parser.add_argument("--shard", type=int, default=0, help="numéro de ce shard (0 à nb-shards - 1)")
+    parser.add_argument("--nb-shards", type=int, default=1,
+                        help="nombre de shards (processus ou machines) se partageant les tags")
+    parser.add_argument("--workers", type=int, default=NB_WORKERS)
+    args = parser.parse_args()
+    instrumentation.demarrer_export()
+
+    # Chaque shard a sa propre plage d'index, sa progression et son CSV
+    progress_file = fichier_shard(PROGRESS_FILE, args.shard, args.nb_shards)
+    output_file = fichier_shard(OUTPUT_FILE, args.shard, args.nb_shards)
+    ensure_csv(output_file)
+
+    prochain_index, last_length = load_progress(progress_file)
+    print(f"➡️ Reprise : index={prochain_index}, longueur={last_length}")
+    print(f"➡️ Shard {args.shard + 1}/{args.nb_shards}, {args.workers} requêtes en parallèle")
+
+    csv_file = open(output_file, "a", newline="", encoding="utf-8")
+    ecrivain = EcrivainOrdonne(csv_file, progress_file)
+    fenetre = args.workers * 4
 
-            if is_valid:
-                print(f"✅ Clan valide trouvé : {tag}")
+    t0 = time()
 
-        save_progress(None, length + 1)
-        print(f"➡️ Fin longueur {length}, passage à {length + 1}")
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for length in range(last_length, LONGUEUR_MAX + 1):
+            debut, fin = plage_shard(length, args.shard, args.nb_shards)
+            if length == last_length:
+                debut = max(debut, prochain_index)
+            print(f"\n📏 Longueur de tag = {length} (index {debut} à {fin - 1})")
+
+            # Fenêtre glissante : les requêtes partent en parallèle, les
+            # résultats sont consommés dans l'ordre des index
+            en_vol = deque()
+            for index, tag in generate_tags(length, debut, fin):
+                en_vol.append((index, tag, pool.submit(check_clan_exists, tag)))
+                if len(en_vol) >= fenetre:
+                    index_fini, tag_fini, futur = en_vol.popleft()
+                    ecrivain.ajouter(index_fini, tag_fini, futur.result(), length)
+
+            while en_vol:
+                index_fini, tag_fini, futur = en_vol.popleft()
+                ecrivain.ajouter(index_fini, tag_fini, futur.result(), length)
+
+            ecrivain.vider(length)
+            save_progress(0, length + 1, progress_file)
+            print(f"\n➡️ Fin longueur {length}, passage à {length + 1}")
 
     csv_file.close()
     print(f"\n🎉 Fin totale en {time() - t0:.1f}s.")
@@ -1,8 +1,18 @@
-import requests
+import aiohttp
+import asyncio
 import csv
 import os
+import random
+import sys
 import time
 
+from combats_vus import CombatsVus, cle_combat
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentation
+import stockage_binaire
+from base_combats import charger_ids_cartes
+
 
 def load_api_key(path="cle_api.txt"):
     try:
@@ -14,17 +24,26 @@ def load_api_key(path="cle_api.txt"):
 
 
 API_KEY = load_api_key()
-BASE_URL = "https://api.clashroyale.com/v1"
+# CR_API_URL permet de viser le serveur simulé (serveur_api_simule.py)
+BASE_URL = os.environ.get("CR_API_URL", "https://api.clashroyale.com/v1")
 PLAYERS_FILE = "../dataset/recherche_joueurs.csv"
 OUTPUT_FILE = "../dataset/combats_joueurs.csv"
 PROGRESS_FILE = "../progression/progress_combats.txt"
+CARTES_FILE = "../dataset/cartes.csv"
 
 
-session = requests.Session()
-session.headers.update({
+HEADERS = {
     "Accept": "application/json",
     "Authorization": f"Bearer {API_KEY}"
-})
+}
+
+# Concurrence et débit : à ajuster selon le quota de la clé API
+NB_REQUETES_SIMULTANEES = 8
+REQUETES_PAR_SECONDE = 10
+RAFALE_MAX = 10
+NB_ESSAIS = 5
+DELAI_BASE_RETRY = 0.5  # secondes, doublé à chaque nouvel essai
+LOT_INGESTION = 200     # joueurs terminés entre deux mises à jour de la base binaire
 
 
 # ----------------------------------------------------------
@@ -55,18 +74,61 @@ def load_player_tags():
     return tags
 
 
+# ----------------------------------------------------------
+# Limiteur de débit (seau à jetons)
+# ----------------------------------------------------------
+class LimiteurDebit:
+    """Autorise en moyenne `debit` requêtes par seconde, avec des rafales
+    d'au plus `rafale` requêtes."""
+
+    def __init__(self, debit, rafale):
+        self.debit = debit
+        self.rafale = rafale
+        self.jetons = rafale
+        self.dernier = time.monotonic()
+        self.verrou = asyncio.Lock()
+
+    async def attendre(self):
+        async with self.verrou:
+            while True:
+                maintenant = time.monotonic()
+                self.jetons = min(self.rafale, self.jetons + (maintenant - self.dernier) * self.debit)
+                self.dernier = maintenant
+                if self.jetons >= 1:
+                    self.jetons -= 1
+                    return
+                await asyncio.sleep((1 - self.jetons) / self.debit)
+
+
 # ----------------------------------------------------------
 # Récupérer combats d’un joueur
 # ----------------------------------------------------------
-def get_battles(player_tag):
+async def get_battles(session, limiteur, player_tag):
+    """Battlelog du joueur ; réessaie avec attente exponentielle sur 429 / 5xx."""
     url = f"{BASE_URL}/players/{player_tag.replace('#', '%23')}/battlelog"
-    try:
-        r = session.get(url, timeout=5)
-        if r.status_code != 200:
-            return []
-        return r.json()
-    except:
-        return []
+
+    for essai in range(NB_ESSAIS):
+        with instrumentation.chrono("attente_debit"):
+            await limiteur.attendre()
+        attente = DELAI_BASE_RETRY * 2 ** essai * (1 + random.random())
+        try:
+            with instrumentation.chrono("http_requete", api="battlelog"):
+                async with session.get(url) as r:
+                    instrumentation.compter("http_reponses", api="battlelog", statut=r.status)
+                    if r.status == 200:
+                        return await r.json()
+                    if r.status != 429 and r.status < 500:
+                        return []
+                    # 429 : l'API indique parfois combien de temps patienter
+                    if r.headers.get("Retry-After", "").isdigit():
+                        attente = max(attente, int(r.headers["Retry-After"]))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            instrumentation.compter("http_erreurs", api="battlelog", erreur=type(e).__name__)
+        with instrumentation.chrono("attente_retry"):
+            await asyncio.sleep(attente)
+
+    print(f"❌ Abandon après {NB_ESSAIS} essais : {player_tag}")
+    return []
 
 
 # ----------------------------------------------------------
@@ -120,12 +182,98 @@ def extract_battle_data(battle):
     ]
 
 
+# ----------------------------------------------------------
+# Ingestion dans la base binaire
+# ----------------------------------------------------------
+def ingerer_combats():
+    """Ajoute à la base binaire (colonnes, index, agrégats) les combats
+    écrits dans le CSV depuis la dernière ingestion."""
+    dossier = stockage_binaire.chemin_binaire(OUTPUT_FILE)
+    avant = (stockage_binaire.lire_meta(dossier) or {}).get("nb_lignes", 0)
+    with instrumentation.chrono("ingestion_binaire"):
+        meta = stockage_binaire.synchroniser(OUTPUT_FILE, dossier, charger_ids_cartes(CARTES_FILE))
+    print(f"   💾 Base binaire : +{meta['nb_lignes'] - avant} combats ({meta['nb_lignes']} au total)")
+
+
 # ----------------------------------------------------------
 # Main
 # ----------------------------------------------------------
+async def traiter_joueurs(players, writer, output, vus):
+    """Récupère les combats de tous les joueurs avec NB_REQUETES_SIMULTANEES
+    requêtes en parallèle. La progression enregistrée est le dernier joueur
+    dont tous les prédécesseurs sont terminés : une reprise ne saute donc
+    jamais un joueur, même si les réponses arrivent dans le désordre.
+    Les combats déjà présents dans vus (autre joueur, exploration
+    précédente) ne sont pas réécrits."""
+    limiteur = LimiteurDebit(REQUETES_PAR_SECONDE, RAFALE_MAX)
+    file = asyncio.Queue()
+    for i, tag in enumerate(players):
+        file.put_nowait((i, tag))
+
+    termines = set()
+    prochain = 0  # premier indice pas encore terminé
+    derniere_ingestion = 0
+    ingestion_en_cours = False
+
+    async def worker(session):
+        nonlocal prochain, derniere_ingestion, ingestion_en_cours
+        while True:
+            try:
+                i, player_tag = file.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            battles = await get_battles(session, limiteur, player_tag)
+
+            count_valid = 0
+            count_doublons = 0
+            with instrumentation.chrono("ecriture_csv"):
+                for battle in battles:
+                    data = extract_battle_data(battle)
+                    if not data:
+                        continue
+                    cle = cle_combat(battle)
+                    if cle is not None:
+                        if cle in vus:
+                            count_doublons += 1
+                            continue
+                        vus.ajouter(cle)
+                    writer.writerow(data)
+                    count_valid += 1
+            instrumentation.compter("combats_ecrits", count_valid)
+            instrumentation.compter("combats_doublons", count_doublons)
+
+            print(f"✔ Joueur traité : {player_tag} ({len(battles)} combats reçus, "
+                  f"{count_valid} complets ajoutés, {count_doublons} déjà connus)")
+
+            termines.add(i)
+            if i == prochain:
+                while prochain in termines:
+                    termines.remove(prochain)
+                    prochain += 1
+                with instrumentation.chrono("ecriture_csv"):
+                    output.flush()
+                    vus.enregistrer()
+                    save_progress(players[prochain - 1])
+
+                # Les combats déjà écrits sont ajoutés par lots à la base
+                # binaire, dans un thread pour ne pas bloquer les requêtes
+                if prochain - derniere_ingestion >= LOT_INGESTION and not ingestion_en_cours:
+                    ingestion_en_cours = True
+                    derniere_ingestion = prochain
+                    await asyncio.to_thread(ingerer_combats)
+                    ingestion_en_cours = False
+
+    timeout = aiohttp.ClientTimeout(total=5)
+    connecteur = aiohttp.TCPConnector(limit=NB_REQUETES_SIMULTANEES)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout, connector=connecteur) as session:
+        await asyncio.gather(*(worker(session) for _ in range(NB_REQUETES_SIMULTANEES)))
+
+
 def main():
 
     print("📌 Extraction des combats complets...")
+    instrumentation.demarrer_export()
 
     players = load_player_tags()
     print(f"➡️ {len(players)} joueurs à traiter\n")
@@ -133,7 +281,8 @@ def main():
     last = load_progress()
     print(f"➡️ Reprise à partir de : {last}\n")
 
-    start = (last is None)
+    if last is not None and last in players:
+        players = players[players.index(last) + 1:]
 
     # Création CSV
     if not os.path.exists(OUTPUT_FILE):
@@ -149,33 +298,17 @@ def main():
     output = open(OUTPUT_FILE, "a", newline="", encoding="utf-8")
     writer = csv.writer(output)
 
-    for player_tag in players:
-
-        if not start:
-            if player_tag == last:
-                start = True
-            continue
-
-        save_progress(player_tag)
-
-        battles = get_battles(player_tag)
-        print(f"✔ Joueur traité : {player_tag} ({len(battles)} combats reçus)")
-
-        count_valid = 0
-
-        for battle in battles:
-            data = extract_battle_data(battle)
-            if data:
-                writer.writerow(data)
-                count_valid += 1
-
-        print(f"   → {count_valid} combats complets ajoutés")
+    vus = CombatsVus()
+    print(f"➡️ {len(vus)} combats déjà connus\n")
 
-        time.sleep(0.3)
+    t0 = time.time()
+    asyncio.run(traiter_joueurs(players, writer, output, vus))
 
     output.close()
+    vus.compacter()
+    ingerer_combats()
 
-    print("\n🎉 Extraction finie ! Combats complets dans combats_joueurs.csv")
+    print(f"\n🎉 Extraction finie en {time.time() - t0:.1f}s ! Combats complets dans combats_joueurs.csv")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,10 @@
 import requests
 import csv
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentation
 
 
 def load_api_key(path="cle_api.txt"):
@@ -60,7 +64,9 @@ def save_progress(tag):
 def get_clan_members(tag):
     try:
         url = f"{BASE_URL}/clans/{tag.replace('#', '%23')}"
-        r = session.get(url, timeout=4)
+        with instrumentation.chrono("http_requete", api="membres"):
+            r = session.get(url, timeout=4)
+        instrumentation.compter("http_reponses", api="membres", statut=r.status_code)
 
         if r.status_code != 200:
             return []
@@ -68,7 +74,8 @@ def get_clan_members(tag):
         data = r.json()
         return data.get("memberList", [])
 
-    except:
+    except Exception as e:
+        instrumentation.compter("http_erreurs", api="membres", erreur=type(e).__name__)
         return []
 
 
@@ -77,6 +84,7 @@ def get_clan_members(tag):
 # -------------------------------------------------------------
 def main():
     print("📌 Extraction des joueurs en cours...")
+    instrumentation.demarrer_export()
 
     # Charger les clans valides
     clans = load_valid_clans(CLANS_FILE)
@@ -114,12 +122,13 @@ def main():
 
         members = get_clan_members(clan_tag)
 
-        for m in members:
-            ptag = m["tag"]
+        with instrumentation.chrono("ecriture_csv"):
+            for m in members:
+                ptag = m["tag"]
 
-            if ptag not in known_players:
-                known_players.add(ptag)
-                writer.writerow([ptag])
+                if ptag not in known_players:
+                    known_players.add(ptag)
+                    writer.writerow([ptag])
 
         print(f"✔ Clan traité : {clan_tag} ({len(members)} joueurs)")
 
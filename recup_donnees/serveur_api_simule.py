@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import csv
+import random
+import time
+
+from aiohttp import web
+
+# ----------------------------------------------------------
+# Serveur local imitant l'API Clash Royale
+# ----------------------------------------------------------
+# Sert /v1/players/{tag}/battlelog et /v1/clans/{tag} avec des données
+# déterministes (graine = tag), un quota de requêtes par seconde (429 +
+# Retry-After au-delà) et une part d'erreurs 503, pour tester les
+# scripts de recup_donnees sans clé ni réseau :
+#
+#   python serveur_api_simule.py --port 8080 --debit 20
+#   CR_API_URL=http://127.0.0.1:8080/v1 python recherche_combats.py
+# ----------------------------------------------------------
+
+CARTES_FILE = "../dataset/cartes.csv"
+NB_COMBATS_PAR_JOUEUR = 25
+
+
+def load_card_names(path=CARTES_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [row[1] for row in reader if row]
+
+
+class Quota:
+    """Seau à jetons côté serveur : refuse les requêtes au-delà du débit."""
+
+    def __init__(self, debit):
+        self.debit = debit
+        self.jetons = debit
+        self.dernier = time.monotonic()
+
+    def accepter(self):
+        maintenant = time.monotonic()
+        self.jetons = min(self.debit, self.jetons + (maintenant - self.dernier) * self.debit)
+        self.dernier = maintenant
+        if self.jetons >= 1:
+            self.jetons -= 1
+            return True
+        return False
+
+
+def fake_player(rng, cards, tag):
+    return {
+        "tag": tag,
+        "startingTrophies": rng.randint(3000, 9000),
+        "crowns": rng.randint(0, 3),
+        "cards": [{"name": name} for name in rng.sample(cards, 8)],
+    }
+
+
+def fake_battlelog(tag, cards):
+    rng = random.Random(tag)
+    battles = []
+    for i in range(NB_COMBATS_PAR_JOUEUR):
+        team = fake_player(rng, cards, tag)
+        opponent = fake_player(rng, cards, f"#SIM{rng.randint(0, 99999)}")
+        battles.append({
+            "battleTime": f"20261018T{i:02d}{rng.randint(0, 59):02d}00.000Z",
+            "team": [team],
+            "opponent": [opponent],
+        })
+    return battles
+
+
+def creer_application(debit, taux_erreur, latence):
+    cards = load_card_names()
+    quota = Quota(debit)
+    stats = {"ok": 0, "429": 0, "503": 0}
+
+    async def controle(request):
+        if not quota.accepter():
+            stats["429"] += 1
+            raise web.HTTPTooManyRequests(headers={"Retry-After": "1"})
+        if random.random() < taux_erreur:
+            stats["503"] += 1
+            raise web.HTTPServiceUnavailable()
+        if latence:
+            await asyncio.sleep(latence)
+        stats["ok"] += 1
+
+    async def battlelog(request):
+        await controle(request)
+        return web.json_response(fake_battlelog(request.match_info["tag"], cards))
+
+    async def clan(request):
+        await controle(request)
+        tag = request.match_info["tag"]
+        rng = random.Random(tag)
+        # environ un clan sur dix existe
+        if rng.random() > 0.1:
+            raise web.HTTPNotFound()
+        members = [{"tag": f"#SIM{rng.randint(0, 99999)}"} for _ in range(rng.randint(1, 50))]
+        return web.json_response({"tag": tag, "memberList": members})
+
+    async def afficher_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get("/v1/players/{tag}/battlelog", battlelog)
+    app.router.add_get("/v1/clans/{tag}", clan)
+    app.router.add_get("/stats", afficher_stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API Clash Royale simulée")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--debit", type=float, default=20, help="requêtes/s acceptées")
+    parser.add_argument("--erreurs", type=float, default=0.02, help="part de réponses 503")
+    parser.add_argument("--latence", type=float, default=0.05, help="latence simulée (s)")
+    args = parser.parse_args()
+
+    web.run_app(creer_application(args.debit, args.erreurs, args.latence), host="127.0.0.1", port=args.port)
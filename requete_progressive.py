@@ -0,0 +1,125 @@
+# Requête progressive : aperçu pendant la construction d'un deck
+# ------------------------------------------------------------
+# Pour chaque camp, on tient le nombre de cartes du deck partiel présentes
+# dans le deck de ce camp, pour les seules lignes qui en contiennent au
+# moins une (tableau trié des lignes + comptes) : la mémoire d'une requête
+# ne dépend pas du nombre de combats (Streamlit en garde une par deck et
+# par session). Ajouter ou retirer une carte fusionne sa liste de l'index
+# inversé avec ces lignes : le coût est proportionnel aux listes du deck.
+#
+# La répartition des lignes par nombre de cartes communes est tenue à jour
+# en même temps, si bien que le taux de victoire provisoire se lit sans
+# parcourir les compteurs.
+# ------------------------------------------------------------
+
+import numpy as np
+
+from base_combats import valeurs_et_comptes
+
+
+class RequeteProgressive:
+    """Combats correspondant à un deck partiel, mis à jour carte par carte."""
+
+    def __init__(self, base):
+        self.base = base
+        self.cartes = []  # ids, dans l'ordre d'ajout
+        # lignes[cote] (triées) contiennent comptes[cote] >= 1 cartes du deck
+        self.lignes_touchees = {cote: np.empty(0, dtype=np.uint32) for cote in ("g", "p")}
+        self.comptes = {cote: np.empty(0, dtype=np.uint8) for cote in ("g", "p")}
+        # repartition[cote][k] : lignes ayant exactement k cartes du deck
+        self.repartition = {cote: np.zeros(9, dtype=np.int64) for cote in ("g", "p")}
+        for cote in ("g", "p"):
+            self.repartition[cote][0] = len(base)
+
+    def _modifier(self, cid, pas):
+        for cote in ("g", "p"):
+            lignes = self.base.index.lignes(cote, cid)
+            touchees, comptes = self.lignes_touchees[cote], self.comptes[cote]
+            pos = np.searchsorted(touchees, lignes)
+            presentes = pos < len(touchees)
+            presentes[presentes] = touchees[pos[presentes]] == lignes[presentes]
+            anciens = np.zeros(len(lignes), dtype=np.uint8)
+            anciens[presentes] = comptes[pos[presentes]]
+
+            if pas > 0:
+                comptes[pos[presentes]] += np.uint8(1)
+                # lignes nouvelles insérées à leur place : l'ordre reste trié
+                nouvelles = ~presentes
+                touchees = np.insert(touchees, pos[nouvelles], lignes[nouvelles])
+                comptes = np.insert(comptes, pos[nouvelles], np.uint8(1))
+                nouveaux = anciens + np.uint8(1)
+            else:
+                # la carte était dans le deck : toutes ses lignes sont présentes
+                comptes[pos] -= np.uint8(1)
+                garder = comptes > 0
+                touchees, comptes = touchees[garder], comptes[garder]
+                nouveaux = anciens - np.uint8(1)
+
+            self.lignes_touchees[cote], self.comptes[cote] = touchees, comptes
+            self.repartition[cote] -= np.bincount(anciens, minlength=9)
+            self.repartition[cote] += np.bincount(nouveaux, minlength=9)
+
+    def ajouter(self, nom):
+        cid = self.base.ids_cartes.get(nom)
+        if cid is not None and cid not in self.cartes:
+            self._modifier(cid, 1)
+            self.cartes.append(cid)
+
+    def retirer(self, nom):
+        cid = self.base.ids_cartes.get(nom)
+        if cid in self.cartes:
+            self._modifier(cid, -1)
+            self.cartes.remove(cid)
+
+    def definir(self, noms):
+        """Aligne la requête sur un deck (seules les cartes changées coûtent)."""
+        voulus = {self.base.ids_cartes[n] for n in noms if n in self.base.ids_cartes}
+        for cid in list(self.cartes):
+            if cid not in voulus:
+                self.retirer(self.base.noms_cartes[cid])
+        for nom in noms:
+            self.ajouter(nom)
+
+    def seuil(self, precision=None):
+        """Cartes communes exigées : tout le deck partiel, ou la précision
+        si elle est plus basse."""
+        k = len(self.cartes)
+        return min(k, precision) if precision else k
+
+    def victoires(self, precision=None):
+        """(combats gagnés, combats perdus) par un deck contenant au moins
+        seuil cartes du deck partiel."""
+        s = self.seuil(precision)
+        return int(self.repartition["g"][s:].sum()), int(self.repartition["p"][s:].sum())
+
+    def resultat(self, precision=None):
+        """(combats, % de victoires) ; (0, 0) tant que le deck est vide."""
+        if not self.cartes:
+            return 0, 0
+        vic, defaites = self.victoires(precision)
+        combats = vic + defaites
+        return combats, round(vic / combats * 100, 2) if combats else 0
+
+    def lignes(self, cote, precision=None):
+        """Lignes où le deck du côté donné contient au moins seuil cartes.
+        Une telle ligne contient forcément l'une des k - seuil + 1 cartes
+        aux listes les plus courtes : on ne parcourt que ces listes."""
+        if not self.cartes:
+            return np.empty(0, dtype=np.uint32)
+        s = self.seuil(precision)
+        index = self.base.index
+        courtes = sorted(self.cartes, key=lambda c: index.volume(cote, [c]))[:len(self.cartes) - s + 1]
+        candidates = np.concatenate([index.lignes(cote, c) for c in courtes])
+        if len(courtes) > 1:
+            candidates, _ = valeurs_et_comptes(candidates)
+        # chaque candidate est dans une liste du deck, donc parmi les lignes touchées
+        pos = np.searchsorted(self.lignes_touchees[cote], candidates)
+        return candidates[self.comptes[cote][pos] >= s]
+
+    def contre_cartes(self, n=8, precision=None):
+        """Cartes les plus jouées contre les decks correspondants : chez le
+        gagnant quand le deck partiel perd, chez le perdant quand il gagne."""
+        if not self.cartes:
+            return []
+        hist = self.base.histogramme_cartes(self.lignes("p", precision), self.lignes("g", precision))
+        return self.base.meilleures_cartes(hist, n)
@@ -0,0 +1,125 @@
+# Parcours parallèle du CSV de combats
+# ------------------------------------------------------------
+# Les versions de référence (analyse_combat_csv, generer_deck_anti_csv)
+# relisent tout le CSV : un seul cœur, limité par le décodage des lignes.
+# Ici le fichier est découpé en morceaux d'octets alignés sur les fins de
+# ligne, parcourus par un ProcessPoolExecutor ; les comptes partiels de
+# chaque morceau sont ensuite additionnés.
+#
+# Les morceaux sont bornés à TAILLE_MORCEAU octets (mémoire des
+# processus) et au moins aussi nombreux que les processus. Les champs du
+# CSV (tags, cartes, trophées) ne contiennent jamais de retour à la
+# ligne : une coupure après un "\n" tombe toujours entre deux combats.
+# ------------------------------------------------------------
+
+import csv
+import io
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+TAILLE_MORCEAU = 32 * 1024 * 1024       # octets lus d'un coup par un processus
+TAILLE_MIN_PARALLELE = 16 * 1024 * 1024  # en dessous, le lancement des processus coûte plus qu'il ne rapporte
+
+
+def decouper(path, nb_morceaux):
+    """Plages [début, fin) d'octets, en-tête exclu, commençant chacune au
+    début d'une ligne."""
+    taille = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.readline()  # en-tête
+        bornes = [f.tell()]
+        for i in range(1, nb_morceaux):
+            pos = bornes[0] + (taille - bornes[0]) * i // nb_morceaux
+            # depuis pos - 1 : si pos est déjà un début de ligne, on y reste
+            f.seek(max(pos - 1, bornes[-1]))
+            f.readline()
+            if bornes[-1] < f.tell() < taille:
+                bornes.append(f.tell())
+    bornes.append(max(taille, bornes[-1]))
+    return list(zip(bornes, bornes[1:]))
+
+
+def lire_morceau(path, debut, fin):
+    """Lignes CSV (listes de champs) de la plage d'octets."""
+    with open(path, "rb") as f:
+        f.seek(debut)
+        texte = f.read(fin - debut).decode("utf-8")
+    return csv.reader(io.StringIO(texte, newline=""))
+
+
+def nb_processus_conseille(path, nb_processus=None):
+    """nb_processus demandé (tous les cœurs par défaut), ramené à 1 pour
+    un petit fichier."""
+    if nb_processus is None:
+        nb_processus = os.cpu_count() or 1
+    if os.path.getsize(path) < TAILLE_MIN_PARALLELE:
+        return 1
+    return max(nb_processus, 1)
+
+
+def parcourir(path, fonction, args, reduire, nb_processus=None):
+    """reduire([fonction(path, debut, fin, *args) pour chaque morceau]),
+    dans l'ordre du fichier."""
+    nb_processus = nb_processus_conseille(path, nb_processus)
+    nb_morceaux = max(nb_processus, -(-os.path.getsize(path) // TAILLE_MORCEAU))
+    morceaux = decouper(path, nb_morceaux)
+    if nb_processus == 1:
+        return reduire([fonction(path, debut, fin, *args) for debut, fin in morceaux])
+    with ProcessPoolExecutor(max_workers=min(nb_processus, len(morceaux))) as pool:
+        futures = [pool.submit(fonction, path, debut, fin, *args) for debut, fin in morceaux]
+        return reduire([f.result() for f in futures])
+
+
+# ================================================================
+# Comptes par morceau (exécutés dans les processus)
+# ================================================================
+def combats_morceau(path, debut, fin, deck1_names, deck2_names, precision):
+    """(combats sélectionnés, victoires Deck 1, victoires Deck 2, lignes lues)
+    sur un morceau : mêmes règles que analyse_combat_csv."""
+    deck1, deck2 = set(deck1_names), set(deck2_names)
+    selectionnes = vic_d1 = vic_d2 = lignes = 0
+    for row in lire_morceau(path, debut, fin):
+        lignes += 1
+        w_cards = row[2:10]
+        l_cards = row[12:20]
+        if len(deck1.intersection(w_cards)) >= precision and len(deck2.intersection(l_cards)) >= precision:
+            vic_d1 += 1
+            selectionnes += 1
+        if len(deck2.intersection(w_cards)) >= precision and len(deck1.intersection(l_cards)) >= precision:
+            vic_d2 += 1
+            selectionnes += 1
+    return selectionnes, vic_d1, vic_d2, lignes
+
+
+def sommer_combats(partiels):
+    return tuple(sum(valeurs) for valeurs in zip(*partiels)) if partiels else (0, 0, 0, 0)
+
+
+def cartes_morceau(path, debut, fin, deck_user, precision):
+    """(Counter des cartes adverses, combats retenus) sur un morceau : mêmes
+    règles que generer_deck_anti_csv."""
+    deck = set(deck_user)
+    compteur = Counter()
+    combats = 0
+    for row in lire_morceau(path, debut, fin):
+        gagnant = row[2:10]
+        perdant = row[12:20]
+        if len(deck.intersection(perdant)) >= precision:
+            compteur.update(gagnant)
+            combats += 1
+        if len(deck.intersection(gagnant)) >= precision:
+            compteur.update(perdant)
+            combats += 1
+    return compteur, combats
+
+
+def sommer_cartes(partiels):
+    # fusion dans l'ordre du fichier : les cartes gardent l'ordre de
+    # première apparition, donc les ex aequo de most_common aussi
+    total = Counter()
+    combats = 0
+    for compteur, n in partiels:
+        total.update(compteur)
+        combats += n
+    return total, combats
@@ -0,0 +1,448 @@
+# Format binaire en colonnes des combats
+# ------------------------------------------------------------
+# dataset/combats_joueurs_bin/ contient une colonne par fichier, lue par
+# numpy.memmap (aucune copie, chargement immédiat) :
+#   cg_<g>.bin / cp_<g>.bin     ids des 8 cartes gagnant / perdant (uint8)
+#   tropheesg_<g>.bin / tropheesp_<g>.bin   trophées de départ (int32)
+#   jg_<g>.bin / jp_<g>.bin     tags joueurs, codés dans tags_<g>.txt (uint32)
+#   index_<segment>_*.bin       segments de l'index inversé carte -> lignes
+#   agregats_<version>.npz      compteurs par carte / paire de cartes
+#   masque_{g,p}_{bas,haut}_<g>.bin   masques 128 bits des decks (uint64)
+#   meta.json                   nombre de lignes, version, octets du CSV lus,
+#                               cartes [id, nom] de cartes.csv (ids stockés
+#                               dans cg / cp), segments d'index et agrégats
+# Les masques 128 bits des decks se déduisent de cg / cp : la conversion
+# ne les écrit pas. Le premier processus qui en a besoin complète leurs
+# fichiers jusqu'à ses lignes (ouvrir_masques), puis tous les processus les
+# lisent en memmap : leurs pages sont partagées au lieu d'une copie de
+# 32 octets par ligne dans chaque processus.
+#
+# Le CSV n'étant modifié qu'en ajout (recherche_combats.py), seules les
+# lignes écrites depuis la dernière synchronisation (source_octets) sont
+# lues. Chaque lot ajouté complète les colonnes, ajoute un segment d'index
+# et met à jour les agrégats, puis meta.json est remplacé : un lecteur
+# voit toujours un état complet et cohérent.
+#
+# <g> est la génération : une conversion complète (CSV remplacé, liste
+# des cartes ou format changés) écrit de nouveaux fichiers au lieu de
+# tronquer ceux qu'un autre processus a peut-être ouverts en memmap (lire
+# une page d'un fichier tronqué sous un mapping tue le processus par
+# SIGBUS). Les fichiers d'une génération abandonnée sont supprimés : un
+# processus qui les a ouverts garde l'ancien inode jusqu'à sa fermeture.
+# ------------------------------------------------------------
+
+import csv
+import json
+import os
+from array import array
+
+from contextlib import contextmanager
+
+import numpy as np
+
+from base_combats import (AgregatsCombats, IndexInverse, charger_ids_cartes, construire_index,
+                          fusionner_segments, masques_depuis_ids)
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+FORMAT_VERSION = 6
+TAILLE_LOT = 100_000
+MAX_SEGMENTS = 16  # au-delà, les segments d'index sont fusionnés
+
+# nom -> (dtype, valeurs par ligne)
+COLONNES = {
+    "cg": (np.uint8, 8),
+    "cp": (np.uint8, 8),
+    "tropheesg": (np.int32, 1),
+    "tropheesp": (np.int32, 1),
+    "jg": (np.uint32, 1),
+    "jp": (np.uint32, 1),
+}
+# Complétés à la demande, jamais tronqués (voir ouvrir_masques)
+MASQUES = ("masque_g_bas", "masque_g_haut", "masque_p_bas", "masque_p_haut")
+
+
+def chemin_binaire(path_csv):
+    """dataset/combats_joueurs.csv -> dataset/combats_joueurs_bin"""
+    return os.path.splitext(path_csv)[0] + "_bin"
+
+
+# ================================================================
+# Métadonnées
+# ================================================================
+def lire_meta(dossier):
+    """meta.json du dossier, ou None s'il n'existe pas."""
+    try:
+        with open(os.path.join(dossier, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def ecrire_meta(dossier, meta):
+    """Écriture atomique : un lecteur voit l'ancienne ou la nouvelle version."""
+    tmp = os.path.join(dossier, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(dossier, "meta.json"))
+
+
+def fichier_colonne(meta, nom):
+    return f"{nom}_{meta['generation']}.bin"
+
+
+def fichier_tags(meta):
+    return f"tags_{meta['generation']}.txt"
+
+
+def fichiers_meta(meta):
+    """Fichiers (hors meta.json) utilisés par une version du dossier."""
+    if meta is None or meta.get("format") != FORMAT_VERSION:
+        return set()
+    fichiers = {fichier_colonne(meta, nom) for nom in (*COLONNES, *MASQUES)} | {fichier_tags(meta)}
+    for seg in meta["index"]:
+        fichiers.update(f"index_{seg['nom']}_{cote}_{suffixe}.bin"
+                        for cote in ("g", "p") for suffixe in ("offsets", "lignes"))
+    if meta["agregats"]:
+        fichiers.add(meta["agregats"])
+    return fichiers
+
+
+def cartes_meta(ids_cartes):
+    """[[id, nom], ...] triés par id : les ids réels de cartes.csv, même
+    s'ils ne se suivent pas."""
+    return [[cid, nom] for nom, cid in sorted(ids_cartes.items(), key=lambda x: x[1])]
+
+
+def nb_ids_meta(meta):
+    """Taille des tables indexées par id de carte (plus grand id + 1)."""
+    return max((cid for cid, _ in meta["cartes"]), default=0) + 1
+
+
+def initialiser(dossier, cartes):
+    """Crée un dossier de combats sans aucune ligne, dans une nouvelle
+    génération de fichiers ; les fichiers de l'état précédent ne sont
+    jamais réécrits, seulement supprimés."""
+    os.makedirs(dossier, exist_ok=True)
+    precedente = lire_meta(dossier)
+    # les versions continuent d'augmenter : noms des segments et des
+    # agrégats, et signature des bases ouvertes, restent uniques
+    version = precedente.get("version", 0) + 1 if precedente else 0
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "generation": version,
+        "version": version,
+        "nb_lignes": 0,
+        "nb_tags": 0,
+        "octets_tags": 0,
+        "source_octets": 0,
+        "cartes": cartes,
+        "index": [],
+        "agregats": None,
+    }
+    for fichier in fichiers_meta(meta):
+        open(os.path.join(dossier, fichier), "wb").close()
+    ecrire_meta(dossier, meta)
+    nettoyer(dossier, meta, precedente)
+    return meta
+
+
+@contextmanager
+def verrou(dossier):
+    """Un seul processus à la fois met le dossier à jour (crawler, Streamlit...)."""
+    os.makedirs(dossier, exist_ok=True)
+    with open(os.path.join(dossier, "verrou"), "w") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ================================================================
+# Lecture (memmap)
+# ================================================================
+def ouvrir_colonne(dossier, meta, nom):
+    dtype, largeur = COLONNES[nom]
+    nb_lignes = meta["nb_lignes"]
+    forme = (nb_lignes, largeur) if largeur > 1 else (nb_lignes,)
+    if nb_lignes == 0:
+        return np.zeros(forme, dtype=dtype)
+    return np.memmap(os.path.join(dossier, fichier_colonne(meta, nom)), dtype=dtype, mode="r", shape=forme)
+
+
+def ouvrir_colonnes(dossier, meta):
+    """Toutes les colonnes en memmap, limitées aux lignes validées dans meta."""
+    return {nom: ouvrir_colonne(dossier, meta, nom) for nom in COLONNES}
+
+
+def ouvrir_masques(dossier, meta, ids_g, ids_p, taille_bloc=1 << 20):
+    """Masques (g_bas, g_haut, p_bas, p_haut) des lignes de meta, en memmap.
+
+    Les fichiers ne couvrent que les lignes déjà demandées par un processus :
+    les lignes manquantes sont calculées depuis ids_g / ids_p (par blocs) et
+    écrites sous le verrou, à partir de la fin couverte par les 4 fichiers
+    (un reste d'écriture interrompue est réécrit). Les fichiers ne sont
+    jamais raccourcis : les lignes déjà mappées restent lisibles.
+    OSError si les fichiers manquent (génération supprimée) ou ne peuvent
+    pas être écrits."""
+    nb_lignes = meta["nb_lignes"]
+    if nb_lignes == 0:
+        return tuple(np.zeros(0, dtype=np.uint64) for _ in MASQUES)
+    chemins = [os.path.join(dossier, fichier_colonne(meta, nom)) for nom in MASQUES]
+
+    def couvertes():
+        return min(os.path.getsize(path) for path in chemins) // 8
+
+    if couvertes() < nb_lignes:
+        with verrou(dossier):
+            fichiers = [open(path, "r+b") for path in chemins]
+            try:
+                for debut in range(couvertes(), nb_lignes, taille_bloc):
+                    fin = min(debut + taille_bloc, nb_lignes)
+                    masques = masques_depuis_ids(ids_g[debut:fin]) + masques_depuis_ids(ids_p[debut:fin])
+                    for f, masque in zip(fichiers, masques):
+                        f.seek(debut * 8)
+                        f.write(masque.tobytes())
+            finally:
+                for f in fichiers:
+                    f.close()
+    return tuple(np.memmap(path, dtype=np.uint64, mode="r", shape=(nb_lignes,)) for path in chemins)
+
+
+def lire_segment(dossier, nom, cote):
+    def lire(suffixe, dtype):
+        path = os.path.join(dossier, f"index_{nom}_{cote}_{suffixe}.bin")
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    return lire("offsets", np.int64), lire("lignes", np.uint32)
+
+
+def ecrire_segment(dossier, nom, cote, offsets, lignes):
+    offsets.astype(np.int64).tofile(os.path.join(dossier, f"index_{nom}_{cote}_offsets.bin"))
+    lignes.astype(np.uint32).tofile(os.path.join(dossier, f"index_{nom}_{cote}_lignes.bin"))
+
+
+def ouvrir_index(dossier, meta):
+    """IndexInverse formé des segments listés dans meta (memmap)."""
+    return IndexInverse([lire_segment(dossier, seg["nom"], "g") for seg in meta["index"]],
+                        [lire_segment(dossier, seg["nom"], "p") for seg in meta["index"]])
+
+
+def lire_tags(dossier, meta):
+    """Dictionnaire des tags joueurs : code -> tag."""
+    with open(os.path.join(dossier, fichier_tags(meta)), "rb") as f:
+        contenu = f.read(meta["octets_tags"]).decode("utf-8")
+    return contenu.split("\n")[:meta["nb_tags"]]
+
+
+# ================================================================
+# Ajout de lignes
+# ================================================================
+def encoder_lignes(lignes, ids_cartes, codes_tags, nouveaux_tags):
+    """Convertit des lignes CSV (texte, 20 champs) en colonnes numpy, en une
+    passe sur des tampons d'octets (sans listes de lignes intermédiaires).
+    Les lignes incomplètes sont ignorées."""
+    get = ids_cartes.get
+
+    def code(tag):
+        c = codes_tags.get(tag)
+        if c is None:
+            c = codes_tags[tag] = len(codes_tags)
+            nouveaux_tags.append(tag)
+        return c
+
+    cg, cp = bytearray(), bytearray()
+    tropheesg, tropheesp = array("i"), array("i")
+    jg, jp = array("I"), array("I")
+    for row in csv.reader(lignes):
+        if len(row) < 20:
+            continue
+        cg.extend([get(n, 0) for n in row[2:10]])
+        cp.extend([get(n, 0) for n in row[12:20]])
+        tropheesg.append(int(row[1]))
+        tropheesp.append(int(row[11]))
+        jg.append(code(row[0]))
+        jp.append(code(row[10]))
+
+    return {
+        "cg": np.frombuffer(cg, dtype=np.uint8).reshape(-1, 8),
+        "cp": np.frombuffer(cp, dtype=np.uint8).reshape(-1, 8),
+        "tropheesg": np.frombuffer(tropheesg, dtype=np.int32),
+        "tropheesp": np.frombuffer(tropheesp, dtype=np.int32),
+        "jg": np.frombuffer(jg, dtype=np.uint32),
+        "jp": np.frombuffer(jp, dtype=np.uint32),
+    }
+
+
+def ajouter_colonnes(dossier, meta, colonnes, nouveaux_tags):
+    """Ajoute des colonnes déjà encodées à la fin des fichiers puis valide
+    l'ajout en écrivant meta.json. Un ajout interrompu (fichiers plus longs
+    que meta) est tronqué à la tentative suivante."""
+    nb_lignes = meta["nb_lignes"]
+    for nom, (dtype, largeur) in COLONNES.items():
+        path = os.path.join(dossier, fichier_colonne(meta, nom))
+        os.truncate(path, nb_lignes * largeur * np.dtype(dtype).itemsize)
+        with open(path, "ab") as f:
+            f.write(np.ascontiguousarray(colonnes[nom], dtype=dtype).tobytes())
+
+    path_tags = os.path.join(dossier, fichier_tags(meta))
+    os.truncate(path_tags, meta["octets_tags"])
+    with open(path_tags, "ab") as f:
+        f.write("".join(tag + "\n" for tag in nouveaux_tags).encode("utf-8"))
+        meta["octets_tags"] = f.tell()
+
+    meta["nb_lignes"] = nb_lignes + len(colonnes["cg"])
+    meta["nb_tags"] += len(nouveaux_tags)
+    meta["version"] += 1
+    return meta
+
+
+def lire_lots_csv(path_csv, debut, taille_lot=TAILLE_LOT):
+    """Lots de lignes CSV (texte) lus depuis l'octet debut : (lignes, octet
+    de fin). Une dernière ligne incomplète (écriture en cours) est laissée
+    de côté."""
+    with open(path_csv, "rb") as f:
+        f.seek(debut)
+        position = debut
+        if debut == 0:
+            position += len(f.readline())  # en-tête
+        lot = []
+        for ligne in f:
+            if not ligne.endswith(b"\n"):
+                break
+            position += len(ligne)
+            lot.append(ligne.decode("utf-8"))
+            if len(lot) >= taille_lot:
+                yield lot, position
+                lot = []
+        if lot:
+            yield lot, position
+
+
+def longueur_entete(path_csv):
+    """Octets de la ligne d'en-tête du CSV (0 si elle est incomplète)."""
+    with open(path_csv, "rb") as f:
+        entete = f.readline()
+    return len(entete) if entete.endswith(b"\n") else 0
+
+
+def ajouter_lot(dossier, meta, colonnes, nouveaux_tags, position):
+    """Ajoute un lot de combats encodés : colonnes, segment d'index,
+    agrégats, puis validation par meta.json (avec le filigrane position)."""
+    precedente = json.loads(json.dumps(meta))
+    debut = meta["nb_lignes"]
+    nb_ids = nb_ids_meta(meta)
+
+    meta = ajouter_colonnes(dossier, meta, colonnes, nouveaux_tags)
+    version = meta["version"]
+
+    # Index : un segment pour les nouvelles lignes, fusion si trop de segments
+    nom = f"{version:08d}"
+    for cote, col in (("g", "cg"), ("p", "cp")):
+        ecrire_segment(dossier, nom, cote, *construire_index(colonnes[col], nb_ids, debut))
+    meta["index"] = meta["index"] + [{"nom": nom, "debut": debut, "fin": meta["nb_lignes"]}]
+    if len(meta["index"]) > MAX_SEGMENTS:
+        nom_fusion = f"{version:08d}f"
+        for cote in ("g", "p"):
+            segments = [lire_segment(dossier, seg["nom"], cote) for seg in meta["index"]]
+            ecrire_segment(dossier, nom_fusion, cote, *fusionner_segments(segments, nb_ids))
+        meta["index"] = [{"nom": nom_fusion, "debut": 0, "fin": meta["nb_lignes"]}]
+
+    # Agrégats : version précédente + contribution du lot
+    if meta["agregats"]:
+        agregats = AgregatsCombats.charger(os.path.join(dossier, meta["agregats"]))
+    else:
+        agregats = AgregatsCombats(nb_ids)
+    agregats.ajouter(colonnes["cg"], colonnes["cp"])
+    meta["agregats"] = f"agregats_{version:08d}.npz"
+    agregats.sauvegarder(os.path.join(dossier, meta["agregats"]))
+
+    meta["source_octets"] = position
+    ecrire_meta(dossier, meta)
+    nettoyer(dossier, meta, precedente)
+    return meta
+
+
+def nettoyer(dossier, meta, precedente):
+    """Supprime les fichiers qui ne sont utilisés ni par la version courante
+    ni par la précédente (encore lue par un processus qui n'a pas relu
+    meta.json) : anciens segments, agrégats et générations."""
+    utiles = fichiers_meta(meta) | fichiers_meta(precedente) | {"meta.json", "meta.json.tmp", "verrou"}
+    for fichier in os.listdir(dossier):
+        if fichier not in utiles:
+            os.remove(os.path.join(dossier, fichier))
+
+
+def synchroniser(path_csv, dossier, ids_cartes, progression=None):
+    """Met le dossier binaire à jour avec le CSV : conversion complète la
+    première fois (ou si le CSV a été remplacé), sinon ajout des seules
+    lignes écrites après le filigrane source_octets. Retourne meta.
+
+    progression(lignes, fraction) est appelée après chaque lot ajouté."""
+    cartes = cartes_meta(ids_cartes)
+    meta = lire_meta(dossier)
+    taille = os.path.getsize(path_csv)
+    if meta is not None and meta.get("format") == FORMAT_VERSION and taille == meta["source_octets"]:
+        return meta
+
+    with verrou(dossier):
+        meta = lire_meta(dossier)  # un autre processus a pu synchroniser entre-temps
+        if (meta is None or meta.get("format") != FORMAT_VERSION or
+                meta["cartes"] != cartes or taille < meta["source_octets"]):
+            meta = initialiser(dossier, cartes)
+
+        if taille == meta["source_octets"]:
+            return meta
+
+        codes_tags = {tag: i for i, tag in enumerate(lire_tags(dossier, meta))}
+        depart, ajoutees = meta["source_octets"], 0
+        for lignes, position in lire_lots_csv(path_csv, depart):
+            nouveaux_tags = []
+            colonnes = encoder_lignes(lignes, ids_cartes, codes_tags, nouveaux_tags)
+            meta = ajouter_lot(dossier, meta, colonnes, nouveaux_tags, position)
+            ajoutees += len(colonnes["cg"])
+            if progression is not None:
+                progression(ajoutees, (position - depart) / (taille - depart))
+
+        if meta["source_octets"] == 0:
+            # en-tête seul (fichier tout juste créé) : le filigrane passe
+            # l'en-tête, sinon chaque chargement reprendrait la synchronisation
+            entete = longueur_entete(path_csv)
+            if entete:
+                meta["source_octets"] = entete
+                ecrire_meta(dossier, meta)
+    return meta
+
+
+def convertir_csv(path_csv, dossier=None, ids_cartes=None):
+    """Conversion complète de combats_joueurs.csv vers le format binaire."""
+    if dossier is None:
+        dossier = chemin_binaire(path_csv)
+    if ids_cartes is None:
+        ids_cartes = charger_ids_cartes()
+    with verrou(dossier):
+        initialiser(dossier, cartes_meta(ids_cartes))
+    return synchroniser(path_csv, dossier, ids_cartes)
+
+
+if __name__ == "__main__":
+    # python stockage_binaire.py [combats.csv]
+    import sys
+
+    from base_combats import DONNEES_COMBATS
+
+    source = sys.argv[1] if len(sys.argv) > 1 else DONNEES_COMBATS
+    meta = convertir_csv(source)
+    dossier = chemin_binaire(source)
+    taille_bin = sum(os.path.getsize(os.path.join(dossier, f)) for f in os.listdir(dossier))
+    print(f"{meta['nb_lignes']} combats convertis : CSV {os.path.getsize(source) / 1e6:.1f} Mo "
+          f"-> binaire {taille_bin / 1e6:.1f} Mo ({dossier})")
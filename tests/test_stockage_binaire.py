@@ -0,0 +1,137 @@
+# python -m pytest tests/
+import os
+import subprocess
+import sys
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RACINE)
+sys.path.append(os.path.join(RACINE, "benchmarks"))
+
+import numpy as np
+
+import stockage_binaire
+from base_combats import CARTES_FILE, charger_ids_cartes, lire_csv_combats, masques_depuis_ids, ouvrir_base
+from generateur_combats import generer_csv
+
+# Lecteur : ouvre la base, fait réinitialiser le dossier par un autre
+# processus à partir d'un CSV plus court, puis relit ses colonnes. Avant
+# les générations de fichiers, la relecture tuait le processus (SIGBUS).
+LECTEUR = """
+import subprocess, sys
+sys.path.append({racine!r})
+import stockage_binaire
+from base_combats import charger_ids_cartes, ouvrir_base
+
+base = ouvrir_base({dossier!r})
+avant = base.ids_g[-1].tolist(), int(base.trophees_g[-1]), len(base)
+subprocess.run([sys.executable, "-c", "import sys; sys.path.append({racine!r}); import stockage_binaire; "
+                "from base_combats import charger_ids_cartes; "
+                "stockage_binaire.convertir_csv({court!r}, {dossier!r}, charger_ids_cartes({cartes!r}))"],
+               check=True)
+assert (base.ids_g[-1].tolist(), int(base.trophees_g[-1]), len(base)) == avant
+assert int(base.masque_g_bas[-1]) >= 0 and base.index.volume("g", [1]) >= 0
+"""
+
+
+def test_base_ouverte_lisible_apres_reinitialisation(tmp_path):
+    cartes = os.path.join(RACINE, CARTES_FILE)
+    long, court = str(tmp_path / "long.csv"), str(tmp_path / "court.csv")
+    generer_csv(long, 5000, graine=1)
+    generer_csv(court, 50, graine=2)
+    dossier = str(tmp_path / "combats_bin")
+    stockage_binaire.convertir_csv(long, dossier, charger_ids_cartes(cartes))
+
+    script = LECTEUR.format(racine=RACINE, dossier=dossier, court=court, cartes=cartes)
+    resultat = subprocess.run([sys.executable, "-c", script], cwd=RACINE, capture_output=True, text=True)
+    assert resultat.returncode == 0, resultat.stderr
+
+    # le dossier décrit maintenant le CSV court, sans fichier de l'ancienne génération
+    base = ouvrir_base(dossier)
+    assert len(base) == 50
+    assert set(os.listdir(dossier)) <= stockage_binaire.fichiers_meta(base.meta) | {"meta.json", "verrou"}
+
+
+def test_ids_de_cartes_non_consecutifs(tmp_path):
+    # cartes.csv avec des trous dans les ids : les colonnes gardent les vrais
+    # ids, la base binaire doit les relier aux mêmes noms que le CSV
+    ids = charger_ids_cartes(os.path.join(RACINE, CARTES_FILE))
+    ids_troues = {nom: cid + 3 * (cid > 40) for nom, cid in ids.items()}
+    path = str(tmp_path / "combats.csv")
+    generer_csv(path, 2000, graine=3)
+    dossier = str(tmp_path / "combats_bin")
+    stockage_binaire.convertir_csv(path, dossier, ids_troues)
+
+    base = ouvrir_base(dossier)
+    reference = lire_csv_combats(path, ids_troues)
+    assert base.ids_cartes == ids_troues
+    assert base.noms_cartes == reference.noms_cartes
+    assert (base.ids_g == reference.ids_g).all()
+    assert (base.agregats.victoires == reference.agregats.victoires).all()
+    assert base.index.volume("g", [max(ids_troues.values())]) == reference.index.volume("g", [max(ids_troues.values())])
+
+
+def test_csv_sans_combats(tmp_path):
+    # combats_joueurs.csv tel que créé par recherche_combats : en-tête seul.
+    # La base ouverte est vide (pas de segment d'index ni d'agrégats).
+    ids = charger_ids_cartes(os.path.join(RACINE, CARTES_FILE))
+    path = str(tmp_path / "combats.csv")
+    generer_csv(path, 0)
+    dossier = str(tmp_path / "combats_bin")
+    stockage_binaire.convertir_csv(path, dossier, ids)
+
+    base = ouvrir_base(dossier)
+    assert len(base) == 0
+    assert len(base.index.lignes("g", 1)) == 0
+    assert base.index.volume("p", [1, 2]) == 0
+    assert base.agregats.victoires.sum() == 0
+    assert base.lignes_tranche((4000, 6000)) is not None and len(base.lignes_tranche((4000, 6000))) == 0
+
+
+def test_filigrane_apres_en_tete_seul(tmp_path):
+    # sans ligne complète, le filigrane passe l'en-tête : les chargements
+    # suivants ne resynchronisent pas, et les lignes ajoutées ensuite sont lues
+    ids = charger_ids_cartes(os.path.join(RACINE, CARTES_FILE))
+    path, complet = str(tmp_path / "combats.csv"), str(tmp_path / "complet.csv")
+    generer_csv(path, 0)
+    generer_csv(complet, 30, graine=4)
+    dossier = str(tmp_path / "combats_bin")
+    meta = stockage_binaire.synchroniser(path, dossier, ids)
+    assert meta["source_octets"] == os.path.getsize(path)
+    assert stockage_binaire.lire_meta(dossier) == meta
+
+    with open(complet, "rb") as f:
+        f.readline()
+        lignes = f.read()
+    with open(path, "ab") as f:
+        f.write(lignes)
+    meta = stockage_binaire.synchroniser(path, dossier, ids)
+    assert meta["nb_lignes"] == 30 and meta["source_octets"] == os.path.getsize(path)
+    assert (ouvrir_base(dossier).ids_g == lire_csv_combats(complet, ids).ids_g).all()
+
+
+def test_masques_memmap_completes_a_la_demande(tmp_path):
+    # masques écrits par le premier lecteur, complétés après un ajout (par-
+    # dessus un reste d'écriture interrompue), puis relus en memmap
+    ids = charger_ids_cartes(os.path.join(RACINE, CARTES_FILE))
+    path, suite = str(tmp_path / "combats.csv"), str(tmp_path / "suite.csv")
+    generer_csv(path, 300, graine=5)
+    generer_csv(suite, 200, graine=6)
+    dossier = str(tmp_path / "combats_bin")
+    stockage_binaire.convertir_csv(path, dossier, ids)
+
+    base = ouvrir_base(dossier)
+    assert all(isinstance(m, np.memmap) for m in base.masques)
+    with open(suite, "rb") as f:
+        f.readline()
+        lignes = f.read()
+    with open(path, "ab") as f:
+        f.write(lignes)
+    meta = stockage_binaire.synchroniser(path, dossier, ids)
+    with open(os.path.join(dossier, stockage_binaire.fichier_colonne(meta, "masque_p_haut")), "ab") as f:
+        f.write(b"\xff\xff\xff")
+
+    nouvelle = ouvrir_base(dossier)
+    attendus = masques_depuis_ids(nouvelle.ids_g) + masques_depuis_ids(nouvelle.ids_p)
+    assert all((m == a).all() for m, a in zip(nouvelle.masques, attendus))
+    assert all(len(m) == 300 for m in base.masques)
+    assert all((m == a[:300]).all() for m, a in zip(base.masques, attendus))